@@ -0,0 +1,301 @@
+import math
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAD_TO_STD = 1.4826
+
+# Floors for the z-score denominators, in each feature's own units
+MIN_SCALES = {
+    'trade_return': 1e-5,     # 0.1 bps log return
+    'trade_volume': 0.05,     # log(qty)
+    'kline_return': 1e-4,
+    'kline_volume': 0.05,     # log(volume)
+    'spread': 0.5,            # bps
+    'imbalance': 0.05,
+}
+
+# Quiet markets and tight spreads are not anomalies
+UPSIDE_ONLY = {'volume_spike', 'spread_blowout'}
+
+# |z| thresholds for each severity level, checked from the top
+SEVERITY_LEVELS = (
+    ('critical', 10.0),
+    ('high', 6.0),
+    ('medium', 4.0),
+)
+
+
+class Welford:
+    """Running mean and variance over the whole stream (Welford's algorithm)"""
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class EWMAStats:
+    """Exponentially weighted mean and variance; `alpha` = 2 / (span + 1)"""
+    __slots__ = ('alpha', 'mean', 'var', 'initialized')
+
+    def __init__(self, span: float = 100):
+        self.alpha = 2.0 / (span + 1.0)
+        self.mean = 0.0
+        self.var = 0.0
+        self.initialized = False
+
+    def zscore(self, x: float, min_scale: float = 0.0) -> float:
+        """Score `x` against the statistics before it is folded in"""
+        scale = max(math.sqrt(self.var), min_scale)
+        if not self.initialized or scale <= 0:
+            return 0.0
+        return (x - self.mean) / scale
+
+    def update(self, x: float):
+        if not self.initialized:
+            self.mean = x
+            self.initialized = True
+            return
+        delta = x - self.mean
+        incr = self.alpha * delta
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + delta * incr)
+
+
+class StreamingMedianMAD:
+    """
+    Constant-memory approximation of the median and MAD.
+
+    Both are tracked with a stochastic-approximation quantile estimator whose step
+    size follows the current MAD, so it adapts to the scale of the series without
+    storing a window. A single outlier moves the estimate by at most one step.
+    """
+    __slots__ = ('rate', 'median', 'mad', 'count')
+
+    def __init__(self, rate: float = 0.05):
+        self.rate = rate
+        self.median = 0.0
+        self.mad = 0.0
+        self.count = 0
+
+    def zscore(self, x: float, min_scale: float = 0.0) -> float:
+        scale = max(MAD_TO_STD * self.mad, min_scale)
+        if self.count < 2 or scale <= 0:
+            return 0.0
+        return (x - self.median) / scale
+
+    def update(self, x: float):
+        self.count += 1
+        if self.count == 1:
+            self.median = x
+            return
+        deviation = abs(x - self.median)
+        if self.mad <= 0:
+            self.mad = deviation
+            return
+        step = self.rate * self.mad
+        if x > self.median:
+            self.median += min(step, deviation)
+        elif x < self.median:
+            self.median -= min(step, deviation)
+        # Multiplicative steps settle where half the deviations exceed the estimate
+        self.mad *= (1 + self.rate) if deviation > self.mad else (1 - self.rate)
+
+
+class FeatureMonitor:
+    """
+    Scores one feature stream with both an EWMA z-score and a robust median/MAD z-score.
+
+    The EWMA statistics are seeded from a Welford estimate over the warmup period,
+    and `min_scale` keeps near-constant series (e.g. a one-tick spread) from turning
+    every small change into an extreme score.
+    """
+    __slots__ = ('name', 'ewma', 'robust', 'warmup', 'min_scale', 'count', '_seed')
+
+    def __init__(self, name: str, span: float = 200, robust_rate: float = 0.05, warmup: int = 50,
+                 min_scale: float = 0.0):
+        self.name = name
+        self.ewma = EWMAStats(span)
+        self.robust = StreamingMedianMAD(robust_rate)
+        self.warmup = warmup
+        self.min_scale = min_scale
+        self.count = 0
+        self._seed = Welford()
+
+    def update(self, x: float) -> float:
+        """Fold in `x` and return its anomaly score (0 while warming up)"""
+        self.count += 1
+        if self.count <= self.warmup:
+            self._seed.update(x)
+            self.robust.update(x)
+            if self.count == self.warmup:
+                self.ewma.mean, self.ewma.var = self._seed.mean, self._seed.variance
+                self.ewma.initialized = True
+            return 0.0
+
+        ewma_z = self.ewma.zscore(x, self.min_scale)
+        robust_z = self.robust.zscore(x, self.min_scale)
+        self.ewma.update(x)
+        self.robust.update(x)
+        # Both views must agree: EWMA tracks the current regime, MAD guards against fat tails
+        return ewma_z if abs(ewma_z) < abs(robust_z) else robust_z
+
+
+class AnomalyDetector:
+    """
+    Streaming detector for abnormal activity on one symbol.
+
+    Feed it trades, klines and order-book snapshots as they arrive; every update is
+    O(1) time and memory. When a feature's score crosses `threshold` an event dict
+    is returned and passed to the registered callbacks, so a fast-path analysis can
+    be triggered between scheduled cycles. Detected kinds: price_jump, volume_spike,
+    spread_blowout, imbalance_shift.
+    """
+
+    def __init__(self, symbol: str = 'BTCUSDT', threshold: float = 4.0, span: float = 200,
+                 warmup: int = 50, cooldown: float = 5.0, robust_rate: float = 0.05,
+                 max_events: int = 1000):
+        self.symbol = symbol
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.callbacks: List[Callable[[Dict], None]] = []
+        self.features = {
+            name: FeatureMonitor(name, span=span, robust_rate=robust_rate, warmup=warmup, min_scale=min_scale)
+            for name, min_scale in MIN_SCALES.items()
+        }
+        self.events = deque(maxlen=max_events)
+        self.updates = 0
+
+        self._last_trade_price: Optional[float] = None
+        self._last_close: Optional[float] = None
+        self._last_event: Dict[str, float] = {}
+
+    def add_callback(self, callback: Callable[[Dict], None]):
+        self.callbacks.append(callback)
+
+    @staticmethod
+    def severity(score: float) -> str:
+        for level, limit in SEVERITY_LEVELS:
+            if abs(score) >= limit:
+                return level
+        return 'low'
+
+    def _check(self, kind: str, feature: str, value: float, timestamp: Optional[float]) -> Optional[Dict]:
+        score = self.features[feature].update(value)
+        self.updates += 1
+        if abs(score) < self.threshold or (kind in UPSIDE_ONLY and score < 0):
+            return None
+        now = timestamp if timestamp is not None else time.time()
+        if now - self._last_event.get(kind, float('-inf')) < self.cooldown:
+            return None
+        self._last_event[kind] = now
+        event = {
+            'symbol': self.symbol,
+            'type': kind,
+            'feature': feature,
+            'value': value,
+            'zscore': score,
+            'severity': self.severity(score),
+            'direction': 'up' if score > 0 else 'down',
+            'timestamp': now,
+            'detected_at': time.time(),
+        }
+        self.events.append(event)
+        logger.warning(f"{self.symbol} {kind} ({event['severity']}): z={score:+.1f} value={value:.6g}")
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Anomaly callback error: {str(e)}")
+        return event
+
+    # ---------------------------------------------------------------- inputs
+    def on_trade(self, price: float, qty: float, timestamp: Optional[float] = None) -> List[Dict]:
+        """Single trade (e.g. a Binance `trade`/`aggTrade` stream message)"""
+        events = []
+        if self._last_trade_price:
+            event = self._check('price_jump', 'trade_return',
+                                math.log(price / self._last_trade_price), timestamp)
+            if event:
+                events.append(event)
+        self._last_trade_price = price
+        if qty > 0:
+            event = self._check('volume_spike', 'trade_volume', math.log(qty), timestamp)
+            if event:
+                events.append(event)
+        return events
+
+    def on_kline(self, close: float, volume: float, timestamp: Optional[float] = None) -> List[Dict]:
+        """Closed candle; returns are measured close-to-close"""
+        events = []
+        if self._last_close:
+            event = self._check('price_jump', 'kline_return', math.log(close / self._last_close), timestamp)
+            if event:
+                events.append(event)
+        self._last_close = close
+        if volume > 0:
+            event = self._check('volume_spike', 'kline_volume', math.log(volume), timestamp)
+            if event:
+                events.append(event)
+        return events
+
+    def on_book(self, best_bid: float, best_ask: float, bid_qty: float, ask_qty: float,
+                timestamp: Optional[float] = None) -> List[Dict]:
+        """Top-of-book (or summed depth) quantities, e.g. a `bookTicker` message"""
+        events = []
+        mid = (best_bid + best_ask) / 2
+        if mid <= 0:
+            return events
+        spread_bps = (best_ask - best_bid) / mid * 10000
+        event = self._check('spread_blowout', 'spread', spread_bps, timestamp)
+        if event:
+            events.append(event)
+        depth = bid_qty + ask_qty
+        if depth > 0:
+            event = self._check('imbalance_shift', 'imbalance', (bid_qty - ask_qty) / depth, timestamp)
+            if event:
+                events.append(event)
+        return events
+
+    def on_order_book(self, order_book: Dict, timestamp: Optional[float] = None) -> List[Dict]:
+        """Order book in the shape returned by BinanceMonitor.get_order_book"""
+        if not order_book or not order_book.get('bids') or not order_book.get('asks'):
+            return []
+        bids, asks = order_book['bids'], order_book['asks']
+        return self.on_book(bids[0]['price'], asks[0]['price'],
+                            sum(level['quantity'] for level in bids),
+                            sum(level['quantity'] for level in asks), timestamp)
+
+    def on_stream_message(self, message: Dict) -> List[Dict]:
+        """Dispatch a raw Binance market stream payload (trade, aggTrade, kline, bookTicker)"""
+        event_type = message.get('e')
+        if event_type in ('trade', 'aggTrade'):
+            return self.on_trade(float(message['p']), float(message['q']), message['T'] / 1000)
+        if event_type == 'kline':
+            kline = message['k']
+            if not kline.get('x'):
+                return []
+            return self.on_kline(float(kline['c']), float(kline['v']), kline['T'] / 1000)
+        if 'b' in message and 'a' in message and 'B' in message and 'A' in message:
+            return self.on_book(float(message['b']), float(message['a']),
+                                float(message['B']), float(message['A']))
+        return []
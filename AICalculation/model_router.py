@@ -0,0 +1,220 @@
+import re
+import time
+import logging
+from typing import Dict, List
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BULLISH_TERMS = {
+    'surge', 'surges', 'rally', 'rallies', 'soar', 'soars', 'gain', 'gains', 'bullish', 'high', 'highs',
+    'record', 'approval', 'approved', 'adoption', 'inflow', 'inflows', 'buy', 'buying', 'breakout',
+    'upgrade', 'accumulate', 'accumulation', 'partnership', 'launch', 'recover', 'recovers', 'rebound',
+}
+BEARISH_TERMS = {
+    'crash', 'crashes', 'plunge', 'plunges', 'drop', 'drops', 'fall', 'falls', 'bearish', 'low', 'lows',
+    'selloff', 'sell', 'selling', 'outflow', 'outflows', 'hack', 'hacked', 'exploit', 'ban', 'bans',
+    'lawsuit', 'sues', 'fraud', 'liquidation', 'liquidations', 'reject', 'rejected', 'delay', 'delayed',
+    'bankruptcy', 'insolvent', 'fine', 'fined', 'dump', 'collapse',
+}
+NEGATIONS = {'not', 'no', 'never', "n't", 'without', 'denies', 'denied'}
+# Topics where a wrong call is expensive; these are sent to the large model regardless of confidence
+HIGH_IMPACT_TERMS = {
+    'etf', 'sec', 'fed', 'fomc', 'rate', 'rates', 'hack', 'hacked', 'exploit', 'ban', 'lawsuit',
+    'bankruptcy', 'insolvent', 'halving', 'reserve', 'treasury', 'blackrock', 'tariff', 'cpi',
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+
+class LexiconScorer:
+    """
+    Local keyword scorer used as the cheapest routing tier.
+
+    Returns the same dict shape as GeminiMonitor.analyze_crypto_sentiment. Confidence
+    grows with the number of sentiment terms and how one-sided they are, so mixed or
+    sparse headlines come back with low confidence and get escalated.
+    """
+
+    def __init__(self, bullish=None, bearish=None, high_impact=None):
+        self.bullish = set(bullish or BULLISH_TERMS)
+        self.bearish = set(bearish or BEARISH_TERMS)
+        self.high_impact = set(high_impact or HIGH_IMPACT_TERMS)
+
+    def analyze_crypto_sentiment(self, text: str) -> Dict:
+        tokens = TOKEN_PATTERN.findall(str(text).lower())
+        bull = bear = 0
+        negated_until = -1
+        for i, token in enumerate(tokens):
+            if token in NEGATIONS or token.endswith("n't"):
+                # A negation flips the next sentiment term within two tokens
+                negated_until = i + 2
+                continue
+            negated = i <= negated_until
+            if token in self.bullish or token in self.bearish:
+                negated_until = -1
+            if token in self.bullish:
+                bear, bull = (bear + 1, bull) if negated else (bear, bull + 1)
+            elif token in self.bearish:
+                bull, bear = (bull + 1, bear) if negated else (bull, bear + 1)
+
+        hits = bull + bear
+        impact_terms = sorted(self.high_impact.intersection(tokens))
+        if hits == 0:
+            sentiment, confidence = 'neutral', 30
+        else:
+            balance = abs(bull - bear) / hits
+            sentiment = 'neutral' if bull == bear else ('bullish' if bull > bear else 'bearish')
+            # More evidence and a more one-sided balance both raise confidence, capped at 90
+            confidence = int(min(90, 40 + 15 * min(hits, 3) * balance))
+        return {
+            'sentiment': sentiment,
+            'key_points': impact_terms,
+            'market_impact': 'high' if impact_terms else ('medium' if hits else 'low'),
+            'confidence': confidence,
+        }
+
+
+def is_usable(analysis: Dict) -> bool:
+    """False for empty results and GeminiMonitor's 'unknown' placeholder for unparseable replies"""
+    return bool(analysis) and str(analysis.get('sentiment', '')).lower() not in ('', 'unknown')
+
+
+class ModelTier:
+    """One routing tier: an analyzer with the GeminiMonitor interface and its cost model"""
+
+    def __init__(self, name: str, analyzer, min_confidence: float = 70,
+                 cost_per_1k_tokens: float = 0.0, escalate_impacts=('high',),
+                 unavailable_backoff: float = 300.0):
+        self.name = name
+        self.analyzer = analyzer
+        self.min_confidence = min_confidence
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        self.escalate_impacts = set(escalate_impacts)
+        self.unavailable_backoff = unavailable_backoff
+
+        self.calls = 0
+        self.escalations = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_latency = 0.0
+        self.total_cost = 0.0
+        self._unavailable_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def analyze(self, text: str) -> Dict:
+        started = time.perf_counter()
+        try:
+            if callable(self.analyzer) and not hasattr(self.analyzer, 'analyze_crypto_sentiment'):
+                # Lazily constructed analyzers (e.g. GeminiMonitor) are built on first use
+                try:
+                    self.analyzer = self.analyzer()
+                except Exception:
+                    # Missing API key or similar; don't retry construction on every item
+                    self._unavailable_until = time.monotonic() + self.unavailable_backoff
+                    logger.warning(f"Tier {self.name} unavailable for {self.unavailable_backoff:.0f}s")
+                    raise
+            result = self.analyzer.analyze_crypto_sentiment(text)
+            # ~4 characters per token for the text plus the fixed prompt around it
+            self.total_cost += (len(text) + 600) / 4 / 1000 * self.cost_per_1k_tokens
+            return result
+        finally:
+            self.calls += 1
+            self.total_latency += time.perf_counter() - started
+
+    def should_escalate(self, analysis: Dict) -> bool:
+        if not is_usable(analysis):
+            return True
+        try:
+            confidence = float(analysis.get('confidence', 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        impact = str(analysis.get('market_impact', '')).lower()
+        return confidence < self.min_confidence or impact in self.escalate_impacts
+
+
+class TieredSentimentRouter:
+    """
+    Send each item to the cheapest tier first and escalate only when that tier is
+    unsure (confidence below its `min_confidence`) or the item looks high impact.
+
+    The last tier that answered is final: if an escalated tier fails or is unavailable,
+    the cheaper tier's analysis is returned, tagged with that tier. Per-tier call counts, latency, estimated
+    cost and escalation rates are available from `stats()`.
+    """
+
+    def __init__(self, tiers: List[ModelTier]):
+        if not tiers:
+            raise ValueError("At least one tier is required")
+        self.tiers = tiers
+        self.items = 0
+        self.total_latency = 0.0
+
+    def analyze_crypto_sentiment(self, text: str) -> Dict:
+        started = time.perf_counter()
+        result, answered_by = {}, None
+        for i, tier in enumerate(self.tiers):
+            if not tier.available:
+                tier.skipped += 1
+                continue
+            try:
+                analysis = tier.analyze(text)
+            except Exception as e:
+                logger.error(f"Tier {tier.name} failed: {str(e)}")
+                analysis = {}
+            if not is_usable(analysis):
+                tier.failures += 1
+                continue
+            result, answered_by = analysis, tier
+            if i == len(self.tiers) - 1 or not tier.should_escalate(analysis):
+                break
+            tier.escalations += 1
+            logger.info(f"Escalating from {tier.name} (confidence {analysis.get('confidence', 0)}, "
+                        f"impact {analysis.get('market_impact', 'n/a')})")
+        self.items += 1
+        self.total_latency += time.perf_counter() - started
+        return {**result, 'tier': answered_by.name} if result else {}
+
+    def analyze_many(self, texts: List[str]) -> List[Dict]:
+        return [self.analyze_crypto_sentiment(text) for text in texts]
+
+    def stats(self) -> pd.DataFrame:
+        rows = []
+        for tier in self.tiers:
+            rows.append({
+                'tier': tier.name,
+                'calls': tier.calls,
+                'share_of_items': tier.calls / self.items if self.items else 0.0,
+                'escalation_rate': tier.escalations / tier.calls if tier.calls else 0.0,
+                'failures': tier.failures,
+                'skipped': tier.skipped,
+                'avg_latency_ms': tier.total_latency / tier.calls * 1000 if tier.calls else 0.0,
+                'est_cost': tier.total_cost,
+            })
+        return pd.DataFrame(rows)
+
+    def summary(self) -> Dict:
+        return {
+            'items': self.items,
+            'avg_latency_ms': self.total_latency / self.items * 1000 if self.items else 0.0,
+            'est_cost': sum(tier.total_cost for tier in self.tiers),
+        }
+
+
+def default_router(min_confidence: float = 70, fast_model: str = 'gemini-1.5-flash',
+                   pro_model: str = 'gemini-1.5-pro', use_lexicon: bool = True) -> TieredSentimentRouter:
+    """Lexicon -> Gemini flash -> Gemini pro; Gemini clients are created only when first needed"""
+    from Monitoring.gemini_monitor import GeminiMonitor
+
+    tiers = []
+    if use_lexicon:
+        tiers.append(ModelTier('lexicon', LexiconScorer(), min_confidence=min_confidence))
+    # Rough list prices per 1k input tokens; only used for relative cost reporting
+    tiers.append(ModelTier(fast_model, lambda: GeminiMonitor(fast_model), min_confidence=min_confidence,
+                           cost_per_1k_tokens=0.000075))
+    tiers.append(ModelTier(pro_model, lambda: GeminiMonitor(pro_model), cost_per_1k_tokens=0.00125))
+    return TieredSentimentRouter(tiers)
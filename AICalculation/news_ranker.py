@@ -0,0 +1,228 @@
+import re
+import json
+import math
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is',
+    'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'will', 'with',
+    'you', 'your', 'we', 'our', 'they', 'their', 'i', 'http', 'https', 't', 'co', 'amp', 'rt',
+}
+
+# Terms that tend to move the market; used when no explicit query is given
+DEFAULT_QUERY = (
+    "bitcoin btc etf sec fed rate rates inflation cpi regulation regulatory approval approved ban "
+    "lawsuit hack exploit liquidation liquidations whale whales institutional adoption rally crash "
+    "surge plunge halving treasury inflow inflows outflow outflows reserve blackrock tariff"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [tok for tok in TOKEN_PATTERN.findall(str(text).lower()) if tok not in STOPWORDS and len(tok) > 1]
+
+
+def _to_utc(value) -> Optional[pd.Timestamp]:
+    if value is None or value == '':
+        return None
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+    if pd.isna(ts):
+        return None
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+class NewsRanker:
+    """
+    BM25 relevance ranker for choosing which news items and tweets go into the prompt.
+
+    The vocabulary and IDF table are built once (`fit`, or `load_vocabulary` from a
+    prebuilt file) and term counts per document are cached by text, so ranking a
+    fresh batch only tokenizes unseen items. Scores for a whole batch are computed
+    with numpy over the query terms, then boosted for recency and engagement.
+    """
+
+    def __init__(self, query: str = DEFAULT_QUERY, k1: float = 1.5, b: float = 0.75,
+                 recency_half_life_hours: float = 12.0, recency_weight: float = 0.5,
+                 engagement_weight: float = 0.1, relevance_floor: float = 0.1, cache_size: int = 10000):
+        self.k1 = k1
+        self.b = b
+        self.recency_half_life_hours = recency_half_life_hours
+        self.recency_weight = recency_weight
+        self.engagement_weight = engagement_weight
+        self.relevance_floor = relevance_floor
+        self.cache_size = cache_size
+
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0)
+        self.avgdl = 0.0
+        self.n_docs = 0
+        self._doc_freqs = np.zeros(0)
+        self._doc_cache: Dict[str, tuple] = {}
+        self._query_idx = np.zeros(0, dtype=np.int64)
+        self._query_text = query
+
+    # ----------------------------------------------------------- vocabulary
+    @property
+    def is_fitted(self) -> bool:
+        return bool(self.vocabulary)
+
+    def fit(self, texts: Iterable[str], min_df: int = 1) -> 'NewsRanker':
+        """Build the vocabulary, IDF table and average document length from a corpus"""
+        doc_freq = Counter()
+        lengths = []
+        for text in texts:
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            doc_freq.update(set(tokens))
+        n_docs = len(lengths)
+        # Query terms are always part of the vocabulary so they can be scored on unseen batches
+        for term in tokenize(self._query_text):
+            doc_freq.setdefault(term, 0)
+        terms = sorted(t for t, df in doc_freq.items() if df >= min_df or df == 0)
+        self._set_vocabulary(terms, [doc_freq[t] for t in terms], n_docs,
+                             float(np.mean(lengths)) if lengths else 0.0)
+        logger.info(f"Fitted ranker vocabulary: {len(terms)} terms from {n_docs} documents")
+        return self
+
+    def _set_vocabulary(self, terms: List[str], doc_freqs: List[int], n_docs: int, avgdl: float):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        df = np.asarray(doc_freqs, dtype=np.float64)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        self.avgdl = avgdl or 1.0
+        self.n_docs = n_docs
+        self._doc_freqs = df
+        self._doc_cache.clear()
+        self.set_query(self._query_text)
+
+    def save_vocabulary(self, path: str):
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'terms': terms,
+                'doc_freqs': self._doc_freqs.astype(int).tolist(),
+                'n_docs': self.n_docs,
+                'avgdl': self.avgdl,
+            }, f)
+
+    def load_vocabulary(self, path: str) -> 'NewsRanker':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._set_vocabulary(data['terms'], data['doc_freqs'], data['n_docs'], data['avgdl'])
+        logger.info(f"Loaded ranker vocabulary with {len(self.vocabulary)} terms from {path}")
+        return self
+
+    def set_query(self, query: str):
+        self._query_text = query
+        idx = [self.vocabulary[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocabulary]
+        self._query_idx = np.asarray(idx, dtype=np.int64)
+
+    # --------------------------------------------------------------- scoring
+    def _doc_vector(self, text: str) -> tuple:
+        cached = self._doc_cache.get(text)
+        if cached is not None:
+            return cached
+        tokens = tokenize(text)
+        counts = Counter(self.vocabulary[t] for t in tokens if t in self.vocabulary)
+        vector = (np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)),
+                  np.fromiter(counts.values(), dtype=np.float64, count=len(counts)),
+                  len(tokens))
+        if len(self._doc_cache) >= self.cache_size:
+            self._doc_cache.pop(next(iter(self._doc_cache)))
+        self._doc_cache[text] = vector
+        return vector
+
+    def bm25(self, texts: List[str]) -> np.ndarray:
+        """BM25 score of each text against the current query"""
+        if not self.is_fitted:
+            # Never freeze an IDF table built from one small batch; score it with a throwaway fit
+            logger.warning("Ranker has no vocabulary; call fit() or load_vocabulary() first. "
+                           "Using IDF from this batch only")
+            return NewsRanker(self._query_text, self.k1, self.b).fit(texts).bm25(texts)
+        n_query = len(self._query_idx)
+        if not texts or n_query == 0:
+            return np.zeros(len(texts))
+
+        # Map vocabulary index -> column in the (docs x query terms) matrix
+        column = {int(v): j for j, v in enumerate(self._query_idx)}
+        tf = np.zeros((len(texts), n_query))
+        lengths = np.zeros(len(texts))
+        for i, text in enumerate(texts):
+            idx, counts, length = self._doc_vector(text)
+            lengths[i] = length
+            for term, count in zip(idx.tolist(), counts.tolist()):
+                j = column.get(term)
+                if j is not None:
+                    tf[i, j] = count
+
+        norm = self.k1 * (1 - self.b + self.b * lengths / self.avgdl)
+        scores = tf * (self.k1 + 1) / (tf + norm[:, None])
+        return scores @ self.idf[self._query_idx]
+
+    def score(self, texts: List[str], timestamps: Optional[List] = None,
+              engagement: Optional[List[float]] = None, now=None) -> np.ndarray:
+        """
+        Relevance scaled to [0, 1] plus `relevance_floor`, boosted by recency and engagement.
+
+        The floor keeps very recent or widely shared items without query-term overlap
+        from always scoring 0.
+        """
+        relevance = self.bm25(texts)
+        if relevance.size and relevance.max() > 0:
+            relevance = relevance / relevance.max()
+
+        boost = np.ones(len(texts))
+        if timestamps is not None and self.recency_half_life_hours > 0:
+            now = _to_utc(now) or pd.Timestamp(datetime.now(timezone.utc))
+            ages = np.array([
+                max((now - ts).total_seconds() / 3600, 0.0) if ts is not None else np.inf
+                for ts in map(_to_utc, timestamps)
+            ])
+            recency = np.exp(-math.log(2) * ages / self.recency_half_life_hours)
+            boost *= 1 + self.recency_weight * recency
+        if engagement is not None:
+            boost *= 1 + self.engagement_weight * np.log1p(np.maximum(np.asarray(engagement, dtype=float), 0))
+        return (relevance + self.relevance_floor) * boost
+
+    # ----------------------------------------------------------------- top-k
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def rank_articles(self, articles: List[Dict], k: int = 5, now=None) -> List[Dict]:
+        """
+        Top-k articles from DeepSearchNews.parse_news_data, each with a `relevance` field
+        """
+        if not articles or k <= 0:
+            return []
+        texts = [f"{a.get('title', '')} {a.get('description', '')}" for a in articles]
+        scores = self.score(texts, timestamps=[a.get('published_at') for a in articles], now=now)
+        return [{**articles[i], 'relevance': float(scores[i])} for i in self._top_k(scores, k)]
+
+    def rank_tweets(self, df: pd.DataFrame, k: int = 5, now=None) -> pd.DataFrame:
+        """
+        Top-k rows of an XNewsMonitor.search_crypto_news DataFrame, with a `relevance` column
+        """
+        if df.empty or k <= 0:
+            return df.head(0)
+        engagement = (df.get('likes', 0) + 2 * df.get('retweets', 0) + df.get('replies', 0))
+        scores = self.score(df['text'].tolist(), timestamps=df['created_at'].tolist(),
+                            engagement=np.asarray(engagement, dtype=float), now=now)
+        top = self._top_k(scores, k)
+        ranked = df.iloc[top].copy()
+        ranked['relevance'] = scores[top]
+        return ranked
@@ -0,0 +1,185 @@
+import math
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default credibility per source; unknown sources fall back to `default_credibility`
+DEFAULT_SOURCE_CREDIBILITY = {
+    'CoinDesk': 1.0,
+    'Cointelegraph': 0.9,
+    'TheBlock__': 1.0,
+    'BitcoinMagazine': 0.8,
+    'DocumentingBTC': 0.7,
+}
+
+SENTIMENT_SCORES = {
+    'bullish': 1.0,
+    'neutral': 0.0,
+    'bearish': -1.0,
+}
+
+
+def sentiment_to_score(analysis: Dict) -> float:
+    """
+    Convert a GeminiMonitor.analyze_crypto_sentiment result into a score in [-1, 1]
+    """
+    if not analysis:
+        return 0.0
+    direction = SENTIMENT_SCORES.get(str(analysis.get('sentiment', '')).lower(), 0.0)
+    try:
+        confidence = float(analysis.get('confidence', 0)) / 100.0
+    except (TypeError, ValueError):
+        confidence = 0.0
+    return direction * min(max(confidence, 0.0), 1.0)
+
+
+def engagement_weight(likes: int = 0, retweets: int = 0, replies: int = 0) -> float:
+    """
+    Log-scaled engagement weight so a single viral tweet cannot dominate the index
+    """
+    interactions = max(likes, 0) + 2 * max(retweets, 0) + max(replies, 0)
+    return 1.0 + math.log1p(interactions)
+
+
+class StreamingSentimentIndex:
+    """
+    Exponentially decaying, engagement and credibility weighted sentiment index.
+
+    The index keeps a decayed weighted sum of scores and a decayed sum of weights,
+    so every new item is folded in with O(1) work and no window is ever rescanned.
+    `prior_weight` acts as a neutral pseudo-observation: as evidence ages the index
+    drifts back towards 0 instead of holding on to an old reading.
+    """
+
+    def __init__(self, half_life_minutes: float = 60.0, prior_weight: float = 1.0,
+                 source_credibility: Optional[Dict[str, float]] = None,
+                 default_credibility: float = 0.5, max_history: int = 1000):
+        if half_life_minutes <= 0:
+            raise ValueError("half_life_minutes must be positive")
+        self.decay_rate = math.log(2) / (half_life_minutes * 60.0)
+        self.prior_weight = prior_weight
+        self.source_credibility = dict(DEFAULT_SOURCE_CREDIBILITY if source_credibility is None
+                                       else source_credibility)
+        self.default_credibility = default_credibility
+        self.history = deque(maxlen=max_history)
+
+        self._weighted_sum = 0.0
+        self._weight_total = 0.0
+        self._last_update: Optional[float] = None
+        self._count = 0
+
+    @staticmethod
+    def _to_seconds(timestamp) -> float:
+        if timestamp is None:
+            return datetime.now().timestamp()
+        if isinstance(timestamp, (int, float)):
+            return float(timestamp)
+        ts = pd.Timestamp(timestamp)
+        # Naive timestamps (e.g. DeepSearch `published_at`) are UTC, as in news_ranker
+        if ts.tzinfo is None:
+            ts = ts.tz_localize('UTC')
+        return ts.timestamp()
+
+    def _decay_to(self, now: float):
+        if self._last_update is None:
+            self._last_update = now
+            return
+        elapsed = now - self._last_update
+        if elapsed > 0:
+            factor = math.exp(-self.decay_rate * elapsed)
+            self._weighted_sum *= factor
+            self._weight_total *= factor
+            self._last_update = now
+
+    def _item_weight(self, source: Optional[str], likes: int, retweets: int, replies: int) -> float:
+        credibility = self.source_credibility.get(source, self.default_credibility) if source else self.default_credibility
+        return credibility * engagement_weight(likes, retweets, replies)
+
+    def update(self, score: float, timestamp=None, source: Optional[str] = None,
+               likes: int = 0, retweets: int = 0, replies: int = 0) -> float:
+        """
+        Fold one scored item into the index and return the new index value
+        """
+        now = self._to_seconds(timestamp)
+        score = min(max(float(score), -1.0), 1.0)
+        weight = self._item_weight(source, likes, retweets, replies)
+
+        if self._last_update is not None and now < self._last_update:
+            # Late item: age it instead of rewinding the clock
+            weight *= math.exp(-self.decay_rate * (self._last_update - now))
+            now = self._last_update
+        else:
+            self._decay_to(now)
+
+        self._weighted_sum += weight * score
+        self._weight_total += weight
+        self._count += 1
+
+        value = self._value()
+        self.history.append((datetime.fromtimestamp(now, timezone.utc), value))
+        return value
+
+    def update_from_tweets(self, df: pd.DataFrame, score_fn: Callable[[str], float]) -> float:
+        """
+        Fold an XNewsMonitor.search_crypto_news DataFrame into the index, oldest first
+        """
+        if df.empty:
+            return self.value()
+        for _, row in df.sort_values('created_at').iterrows():
+            try:
+                self.update(
+                    score_fn(row['text']),
+                    timestamp=row['created_at'],
+                    source=row.get('author_username'),
+                    likes=int(row.get('likes', 0)),
+                    retweets=int(row.get('retweets', 0)),
+                    replies=int(row.get('replies', 0))
+                )
+            except Exception as e:
+                logger.error(f"Error scoring tweet: {str(e)}")
+                continue
+        logger.info(f"Sentiment index after {len(df)} tweets: {self.value():+.3f}")
+        return self.value()
+
+    def _value(self) -> float:
+        denominator = self._weight_total + self.prior_weight
+        return self._weighted_sum / denominator if denominator > 0 else 0.0
+
+    def value(self, at=None) -> float:
+        """
+        Current index value, decayed to `at` (defaults to now) without mutating state
+        """
+        if self._last_update is None:
+            return 0.0
+        elapsed = max(self._to_seconds(at) - self._last_update, 0.0)
+        factor = math.exp(-self.decay_rate * elapsed)
+        denominator = self._weight_total * factor + self.prior_weight
+        return self._weighted_sum * factor / denominator if denominator > 0 else 0.0
+
+    def effective_weight(self, at=None) -> float:
+        """Decayed total weight, useful as a confidence measure for the index"""
+        if self._last_update is None:
+            return 0.0
+        elapsed = max(self._to_seconds(at) - self._last_update, 0.0)
+        return self._weight_total * math.exp(-self.decay_rate * elapsed)
+
+    def series(self) -> pd.Series:
+        """Index values recorded after each update, indexed by UTC time"""
+        if not self.history:
+            return pd.Series(dtype=float, name='sentiment_index')
+        times, values = zip(*self.history)
+        return pd.Series(values, index=pd.DatetimeIndex(times), name='sentiment_index')
+
+    def snapshot(self) -> Dict:
+        return {
+            'value': self.value(),
+            'effective_weight': self.effective_weight(),
+            'items': self._count,
+            'last_update': (datetime.fromtimestamp(self._last_update, timezone.utc)
+                            if self._last_update else None)
+        }
@@ -5,6 +5,10 @@ from binance.client import Client
 from binance.exceptions import BinanceAPIException
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from typing import Dict, Optional, Tuple
+
+from Monitoring.profiling import profiled_main, span
+from Monitoring.snapshot_cache import SnapshotCache
 
 # Set up logging
 logging.basicConfig(
@@ -13,8 +17,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# (fresh, stale) windows in seconds for each cached endpoint
+DEFAULT_CACHE_TTLS = {
+    'ticker': (1.0, 5.0),
+    'order_book': (0.5, 2.0),
+    'recent_trades': (1.0, 5.0),
+    'klines': (5.0, 30.0),
+}
+
 class BinanceMonitor:
-    def __init__(self):
+    def __init__(self, cache_ttls: Optional[Dict[str, Tuple[float, float]]] = None):
+        # Shared snapshot cache so consumers in one cycle reuse one response; each gets its own copy
+        self.cache = SnapshotCache({**DEFAULT_CACHE_TTLS, **(cache_ttls or {})})
+
         # Load environment variables
         load_dotenv()
         
@@ -54,9 +69,13 @@ class BinanceMonitor:
             
     def get_btc_price(self) -> dict:
         """Get current BTC price and 24h stats"""
+        return self.cache.get('ticker', 'BTCUSDT', self._fetch_btc_price)
+
+    def _fetch_btc_price(self) -> dict:
         try:
             # Get BTC ticker
-            ticker = self.client.get_ticker(symbol='BTCUSDT')
+            with span('binance.get_ticker.request'):
+                ticker = self.client.get_ticker(symbol='BTCUSDT')
             
             price_data = {
                 'symbol': 'BTCUSDT',
@@ -81,13 +100,19 @@ class BinanceMonitor:
             
     def get_recent_trades(self, symbol: str = 'BTCUSDT', limit: int = 50) -> pd.DataFrame:
         """Get recent trades for a symbol"""
+        return self.cache.get('recent_trades', (symbol, limit),
+                              lambda: self._fetch_recent_trades(symbol, limit))
+
+    def _fetch_recent_trades(self, symbol: str, limit: int) -> pd.DataFrame:
         try:
-            trades = self.client.get_recent_trades(symbol=symbol, limit=limit)
+            with span('binance.get_recent_trades.request'):
+                trades = self.client.get_recent_trades(symbol=symbol, limit=limit)
             
-            df = pd.DataFrame(trades)
-            df['time'] = pd.to_datetime(df['time'], unit='ms')
-            df['price'] = df['price'].astype(float)
-            df['qty'] = df['qty'].astype(float)
+            with span('binance.get_recent_trades.dataframe'):
+                df = pd.DataFrame(trades)
+                df['time'] = pd.to_datetime(df['time'], unit='ms')
+                df['price'] = df['price'].astype(float)
+                df['qty'] = df['qty'].astype(float)
             
             logger.info(f"Successfully fetched {len(df)} recent trades for {symbol}")
             return df
@@ -99,10 +124,48 @@ class BinanceMonitor:
             logger.error(f"Error fetching recent trades: {str(e)}")
             return pd.DataFrame()
             
+    def get_klines(self, symbol: str = 'BTCUSDT', interval: str = '1m', limit: int = 100) -> pd.DataFrame:
+        """Get the latest candlesticks for a symbol"""
+        return self.cache.get('klines', (symbol, interval, limit),
+                              lambda: self._fetch_klines(symbol, interval, limit))
+
+    def _fetch_klines(self, symbol: str, interval: str, limit: int) -> pd.DataFrame:
+        try:
+            with span('binance.get_klines.request'):
+                klines = self.client.get_klines(symbol=symbol, interval=interval, limit=limit)
+
+            with span('binance.get_klines.dataframe'):
+                df = pd.DataFrame(klines, columns=[
+                    'timestamp', 'open', 'high', 'low', 'close',
+                    'volume', 'close_time', 'quote_asset_volume',
+                    'number_of_trades', 'taker_buy_base', 'taker_buy_quote', 'ignore'
+                ])
+                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+                df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
+                for column in ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume',
+                               'taker_buy_base', 'taker_buy_quote']:
+                    df[column] = df[column].astype(float)
+                df = df.drop(columns=['ignore'])
+
+            logger.info(f"Successfully fetched {len(df)} {interval} klines for {symbol}")
+            return df
+
+        except BinanceAPIException as e:
+            logger.error(f"Binance API Error in get_klines: {str(e)}")
+            return pd.DataFrame()
+        except Exception as e:
+            logger.error(f"Error fetching klines: {str(e)}")
+            return pd.DataFrame()
+
     def get_order_book(self, symbol: str = 'BTCUSDT', limit: int = 10) -> dict:
         """Get current order book"""
+        return self.cache.get('order_book', (symbol, limit),
+                              lambda: self._fetch_order_book(symbol, limit))
+
+    def _fetch_order_book(self, symbol: str, limit: int) -> dict:
         try:
-            depth = self.client.get_order_book(symbol=symbol, limit=limit)
+            with span('binance.get_order_book.request'):
+                depth = self.client.get_order_book(symbol=symbol, limit=limit)
             
             # Process order book data
             order_book = {
@@ -120,6 +183,7 @@ class BinanceMonitor:
             logger.error(f"Error fetching order book: {str(e)}")
             return {}
 
+@profiled_main('binance_monitor')
 def main():
     try:
         logger.info("Starting Binance Monitor")
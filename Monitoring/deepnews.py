@@ -4,6 +4,8 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from Monitoring.profiling import profiled_main, span
+
 # Set up logging
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(levelname)s - %(message)s')
@@ -44,24 +46,28 @@ class DeepSearchNews:
                 'api_key': self.api_key  # Including API key in params as well
             }
             
-            logger.info(f"Making request to endpoint: {endpoint}")
-            logger.info(f"With parameters: {params}")
+            with span('deepsearch.get_btc_news.logging'):
+                logger.info(f"Making request to endpoint: {endpoint}")
+                logger.info(f"With parameters: {params}")
             
-            response = self.session.get(endpoint, params=params)
+            with span('deepsearch.get_btc_news.request'):
+                response = self.session.get(endpoint, params=params)
             
             # Log response details
-            logger.info(f"Response status code: {response.status_code}")
-            
-            try:
-                response_text = response.text
-                logger.info(f"Response content preview: {response_text[:500]}...")
-            except Exception as e:
-                logger.warning(f"Could not log response content: {str(e)}")
+            with span('deepsearch.get_btc_news.logging'):
+                logger.info(f"Response status code: {response.status_code}")
+                
+                try:
+                    response_text = response.text
+                    logger.info(f"Response content preview: {response_text[:500]}...")
+                except Exception as e:
+                    logger.warning(f"Could not log response content: {str(e)}")
             
             response.raise_for_status()
             
             try:
-                data = response.json()
+                with span('deepsearch.get_btc_news.json'):
+                    data = response.json()
                 logger.info("Successfully parsed JSON response")
                 return data
             except json.JSONDecodeError as e:
@@ -117,6 +123,7 @@ class DeepSearchNews:
             
         return cleaned_articles
 
+@profiled_main('deepnews')
 def main():
     try:
         logger.info("Starting news fetching process")
@@ -5,6 +5,8 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 from typing import Dict, List
 
+from Monitoring.profiling import profiled_main, span
+
 # 환경 변수 로드 (최상단에서 실행)
 load_dotenv()
 
@@ -15,8 +17,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "gemini-1.5-pro"
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Gemini 응답을 감싼 ```json ... ``` 코드 블록 제거
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
 class GeminiMonitor:
-    def __init__(self):
+    def __init__(self, model_name: str = DEFAULT_MODEL):
         # 환경 변수에서 API 키 가져오기
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -26,8 +43,10 @@ class GeminiMonitor:
         try:
             # Gemini API 설정
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel("gemini-1.5-pro")
-            logger.info("Successfully initialized Gemini AI")
+            # 모델 이름은 인자로 지정 (라우터에서 경량 모델 사용 가능)
+            self.model_name = model_name
+            self.model = genai.GenerativeModel(model_name)
+            logger.info(f"Successfully initialized Gemini AI ({model_name})")
         except Exception as e:
             logger.error(f"Failed to initialize Gemini AI: {str(e)}")
             raise
@@ -55,11 +74,12 @@ class GeminiMonitor:
                 "confidence": 85
             }}
             """
-            response = self.model.generate_content(prompt)
+            with span('gemini.analyze_crypto_sentiment.generate'):
+                response = self.model.generate_content(prompt)
 
             # 응답이 JSON 형식인지 확인 후 변환
             try:
-                analysis = json.loads(response.text)
+                analysis = json.loads(strip_code_fence(response.text))
                 logger.info(f"Sentiment analysis successful: {analysis}")
                 return analysis
             except json.JSONDecodeError:
@@ -97,11 +117,12 @@ class GeminiMonitor:
                 "outlook": "positive/negative/uncertain"
             }}
             """
-            response = self.model.generate_content(prompt)
+            with span('gemini.get_crypto_insights.generate'):
+                response = self.model.generate_content(prompt)
 
             # JSON 변환 시도
             try:
-                insights = json.loads(response.text)
+                insights = json.loads(strip_code_fence(response.text))
                 logger.info(f"Generated insights for topic: {topic}")
                 return insights
             except json.JSONDecodeError:
@@ -116,6 +137,7 @@ class GeminiMonitor:
             logger.error(f"Error generating insights: {str(e)}")
             return {}
 
+@profiled_main('gemini_monitor')
 def main():
     try:
         logger.info("Starting Gemini AI Monitor")
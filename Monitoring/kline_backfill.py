@@ -0,0 +1,402 @@
+import os
+import glob
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+from Monitoring.profiling import profiled_main, span
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BINANCE_API_URL = 'https://api.binance.com'
+PAGE_LIMIT = 1000
+KLINE_WEIGHT = 2
+# Small enough that a month of 1m candles still spreads over all workers
+DEFAULT_CHUNK_CANDLES = 2 * PAGE_LIMIT
+
+INTERVAL_UNITS_MS = {'s': 1000, 'm': 60000, 'h': 3600000, 'd': 86400000, 'w': 604800000}
+
+# Columns kept on disk; close_time is open_time + interval - 1 and `ignore` is unused
+FLOAT_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume',
+                 'taker_buy_base', 'taker_buy_quote']
+RAW_INDEX = {'open_time': 0, 'open': 1, 'high': 2, 'low': 3, 'close': 4, 'volume': 5,
+             'quote_asset_volume': 7, 'number_of_trades': 8, 'taker_buy_base': 9, 'taker_buy_quote': 10}
+
+
+def interval_to_ms(interval: str) -> int:
+    """Binance interval string ('1m', '4h', '1d', ...) in milliseconds"""
+    try:
+        return int(interval[:-1]) * INTERVAL_UNITS_MS[interval[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"Unsupported interval: {interval}")
+
+
+def to_ms(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.timestamp() * 1000)
+
+
+def klines_to_columns(klines: List[List]) -> Dict[str, np.ndarray]:
+    """Raw /api/v3/klines rows to column arrays"""
+    columns = {
+        'open_time': np.array([row[RAW_INDEX['open_time']] for row in klines], dtype=np.int64),
+        'number_of_trades': np.array([row[RAW_INDEX['number_of_trades']] for row in klines], dtype=np.int64),
+    }
+    for name in FLOAT_COLUMNS:
+        columns[name] = np.array([row[RAW_INDEX[name]] for row in klines], dtype=np.float64)
+    return columns
+
+
+def check_continuity(open_times: np.ndarray, interval_ms: int, start_ms: Optional[int] = None,
+                     end_ms: Optional[int] = None) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Return (gaps as (first missing, last missing) open times, number of duplicate rows).
+
+    With `start_ms` / `end_ms` the candles expected at either edge of the range are
+    checked too, so missing heads and tails are reported as gaps.
+    """
+    first = -(-start_ms // interval_ms) * interval_ms if start_ms is not None else None
+    last = end_ms - end_ms % interval_ms if end_ms is not None else None
+    if len(open_times) == 0:
+        return ([(first, last)] if first is not None and last is not None and first <= last else []), 0
+    diffs = np.diff(open_times)
+    duplicates = int(np.count_nonzero(diffs == 0))
+    gap_idx = np.nonzero(diffs > interval_ms)[0]
+    gaps = [(int(open_times[i] + interval_ms), int(open_times[i + 1] - interval_ms)) for i in gap_idx]
+    if first is not None and open_times[0] > first:
+        gaps.insert(0, (first, int(open_times[0] - interval_ms)))
+    if last is not None and open_times[-1] < last:
+        gaps.append((int(open_times[-1] + interval_ms), last))
+    return gaps, duplicates
+
+
+class WeightBudget:
+    """
+    Shared request-weight budget per rolling minute.
+
+    Workers reserve weight before each request; the exchange's own
+    `X-MBX-USED-WEIGHT-1M` reading is fed back so the budget also accounts for
+    other clients using the same IP.
+    """
+
+    def __init__(self, weight_per_minute: int = 3000):
+        self.weight_per_minute = weight_per_minute
+        self._events: List[Tuple[float, int]] = []
+        self._reported = 0
+        self._reported_minute = 0
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: int):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._events = [(t, w) for t, w in self._events if now - t < 60]
+                # The exchange counter resets every clock minute
+                reported = self._reported if int(time.time() // 60) == self._reported_minute else 0
+                used = max(sum(w for _, w in self._events), reported)
+                if now >= self._pause_until and used + weight <= self.weight_per_minute:
+                    self._events.append((now, weight))
+                    return
+                wait = max(self._pause_until - now,
+                           60 - (now - self._events[0][0]) if self._events else 1.0, 0.05)
+            time.sleep(min(wait, 1.0))
+
+    def report(self, used_weight: Optional[str]):
+        if used_weight is not None:
+            with self._lock:
+                self._reported = int(used_weight)
+                self._reported_minute = int(time.time() // 60)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+
+class KlineBackfill:
+    """
+    Parallel, resumable kline downloader.
+
+    The timeline is cut into fixed, aligned chunks of `chunk_candles` candles that
+    are downloaded concurrently within the shared weight budget. Each chunk is
+    written atomically as a compressed columnar `.npz` file named after its aligned
+    span, together with the range it actually covers. A rerun skips covered chunks
+    and fetches only the missing part of partial ones (such as the chunk holding
+    the most recent candles). The still-open candle is never stored. `validate` and
+    `load` merge the chunks, drop duplicates and report gaps.
+    """
+
+    def __init__(self, out_dir: str = 'data/klines', base_url: str = BINANCE_API_URL, workers: int = 8,
+                 chunk_candles: int = DEFAULT_CHUNK_CANDLES, weight_per_minute: int = 3000,
+                 max_retries: int = 5, timeout: float = 10.0):
+        self.out_dir = out_dir
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.chunk_candles = chunk_candles
+        self.budget = WeightBudget(weight_per_minute)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'candles': 0, 'retries': 0}
+
+    # ------------------------------------------------------------------ paths
+    def chunk_dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.out_dir, symbol, interval)
+
+    def chunk_path(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> str:
+        return os.path.join(self.chunk_dir(symbol, interval), f"chunk-{start_ms}-{end_ms}.npz")
+
+    def plan_chunks(self, start_ms: int, end_ms: int, interval_ms: int) -> List[Tuple[int, int, int, int]]:
+        """(chunk start, chunk end, needed start, needed end) for every chunk touching the range"""
+        span = self.chunk_candles * interval_ms
+        # Chunk boundaries are aligned to the span so reruns with other ranges reuse chunk files
+        first = start_ms - start_ms % span
+        return [(lo, lo + span - 1, max(lo, start_ms), min(lo + span - 1, end_ms))
+                for lo in range(first, end_ms + 1, span)]
+
+    @staticmethod
+    def _coverage(path: str) -> Optional[Tuple[int, int]]:
+        """(first, last) millisecond a chunk file covers, None if it does not exist"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            lo, hi = data['coverage']
+        return int(lo), int(hi)
+
+    # -------------------------------------------------------------- requests
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _get_page(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[List]:
+        params = {'symbol': symbol, 'interval': interval, 'startTime': start_ms,
+                  'endTime': end_ms, 'limit': PAGE_LIMIT}
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire(KLINE_WEIGHT)
+            try:
+                with span('backfill.request'):
+                    response = self._session().get(f"{self.base_url}/api/v3/klines", params=params,
+                                                   timeout=self.timeout)
+                with self._stats_lock:
+                    self.stats['requests'] += 1
+                self.budget.report(response.headers.get('X-MBX-USED-WEIGHT-1M'))
+                if response.status_code in (418, 429):
+                    retry_after = float(response.headers.get('Retry-After', 60))
+                    logger.warning(f"Rate limited ({response.status_code}), backing off {retry_after}s")
+                    self.budget.pause(retry_after)
+                    raise requests.RequestException(f"HTTP {response.status_code}")
+                response.raise_for_status()
+                with span('backfill.json'):
+                    return response.json()
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"Kline request failed for {symbol} @ {start_ms} "
+                               f"({attempt + 1}/{self.max_retries}): {str(e)}")
+                time.sleep(min(2 ** attempt * 0.5, 30))
+
+    def _fetch_range(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[List]:
+        interval_ms = interval_to_ms(interval)
+        rows = []
+        cursor = start_ms
+        while cursor <= end_ms:
+            # Fixed page windows so an exchange outage (empty page) cannot stall the cursor
+            page_end = min(cursor + PAGE_LIMIT * interval_ms - 1, end_ms)
+            rows.extend(row for row in self._get_page(symbol, interval, cursor, page_end)
+                        if start_ms <= row[0] <= end_ms)
+            cursor = page_end + 1
+        return rows
+
+    def _download_chunk(self, symbol: str, interval: str, chunk_start: int, chunk_end: int,
+                        need_start: int, need_end: int) -> int:
+        path = self.chunk_path(symbol, interval, chunk_start, chunk_end)
+        coverage = self._coverage(path)
+        if coverage is None:
+            segments = [(need_start, need_end)]
+            covered = (need_start, need_end)
+        else:
+            # Only fetch what lies outside the stored range; the result stays one contiguous range
+            covered = (min(coverage[0], need_start), max(coverage[1], need_end))
+            segments = [(lo, hi) for lo, hi in ((covered[0], coverage[0] - 1), (coverage[1] + 1, covered[1]))
+                         if lo <= hi]
+
+        rows = []
+        for lo, hi in segments:
+            rows.extend(self._fetch_range(symbol, interval, lo, hi))
+
+        with span('backfill.write_chunk'):
+            columns = klines_to_columns(rows)
+            if coverage is not None:
+                with np.load(path) as data:
+                    stored = {name: data[name] for name in data.files if name != 'coverage'}
+                merged = {name: np.concatenate([stored[name], columns[name]]) for name in columns}
+                _, keep = np.unique(merged['open_time'], return_index=True)
+                columns = {name: values[keep] for name, values in merged.items()}
+            # Leading dot keeps half-written files out of the chunk-*.npz glob
+            tmp_path = os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}")
+            np.savez_compressed(tmp_path, coverage=np.array(covered, dtype=np.int64), **columns)
+            os.replace(tmp_path, path)
+        with self._stats_lock:
+            self.stats['candles'] += len(rows)
+        return len(rows)
+
+    # -------------------------------------------------------------------- run
+    def run(self, symbols: List[str], interval: str, start, end=None) -> Dict:
+        """Download every missing chunk for `symbols` between `start` and `end` (default: now)"""
+        interval_ms = interval_to_ms(interval)
+        start_ms = to_ms(start)
+        end_ms = to_ms(end) if end is not None else int(time.time() * 1000)
+        # The current candle is still open; stop just before it so it is never stored as final
+        open_candle = int(time.time() * 1000) // interval_ms * interval_ms
+        end_ms = min(end_ms, open_candle - 1)
+
+        jobs, skipped = [], 0
+        for symbol in symbols:
+            os.makedirs(self.chunk_dir(symbol, interval), exist_ok=True)
+            for chunk in self.plan_chunks(start_ms, end_ms, interval_ms):
+                coverage = self._coverage(self.chunk_path(symbol, interval, chunk[0], chunk[1]))
+                if coverage and coverage[0] <= chunk[2] and coverage[1] >= chunk[3]:
+                    skipped += 1
+                    continue
+                jobs.append((symbol, *chunk))
+        logger.info(f"Backfilling {len(jobs)} chunks ({skipped} already on disk) "
+                    f"for {len(symbols)} symbols with {self.workers} workers")
+
+        started = time.monotonic()
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._download_chunk, symbol, interval, *chunk): (symbol, chunk[0])
+                       for symbol, *chunk in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                symbol, chunk_start = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.append((symbol, chunk_start))
+                    logger.error(f"Chunk {symbol} @ {chunk_start} failed: {str(e)}")
+                if done % 10 == 0 or done == len(futures):
+                    elapsed = time.monotonic() - started
+                    logger.info(f"{done}/{len(futures)} chunks, "
+                                f"{self.stats['candles'] / elapsed if elapsed else 0:,.0f} candles/s")
+
+        elapsed = time.monotonic() - started
+        report = {
+            'chunks_downloaded': len(jobs) - len(failed),
+            'chunks_skipped': skipped,
+            'chunks_failed': failed,
+            'candles': self.stats['candles'],
+            'requests': self.stats['requests'],
+            'retries': self.stats['retries'],
+            'seconds': elapsed,
+            'candles_per_second': self.stats['candles'] / elapsed if elapsed else 0.0,
+            'validation': {symbol: self.validate(symbol, interval, start_ms, end_ms) for symbol in symbols},
+        }
+        return report
+
+    # ----------------------------------------------------------- validation
+    def _load_columns(self, symbol: str, interval: str) -> Dict[str, np.ndarray]:
+        paths = sorted(glob.glob(os.path.join(self.chunk_dir(symbol, interval), 'chunk-*.npz')),
+                       key=lambda p: int(os.path.basename(p).split('-')[1]))
+        parts = []
+        for path in paths:
+            with np.load(path) as data:
+                parts.append({name: data[name] for name in data.files if name != 'coverage'})
+        if not parts:
+            return {}
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def validate(self, symbol: str, interval: str, start=None, end=None) -> Dict:
+        """Check the stored series for gaps and duplicate open times"""
+        columns = self._load_columns(symbol, interval)
+        open_times = np.sort(columns.get('open_time', np.zeros(0, dtype=np.int64)))
+        start_ms = to_ms(start) if start is not None else None
+        end_ms = to_ms(end) if end is not None else None
+        if start_ms is not None:
+            open_times = open_times[open_times >= start_ms]
+        if end_ms is not None:
+            open_times = open_times[open_times <= end_ms]
+        gaps, duplicates = check_continuity(open_times, interval_to_ms(interval), start_ms, end_ms)
+        missing = sum((hi - lo) // interval_to_ms(interval) + 1 for lo, hi in gaps)
+        if gaps:
+            logger.warning(f"{symbol} {interval}: {len(gaps)} gaps ({missing} candles missing)")
+        return {'candles': int(len(open_times)), 'gaps': gaps, 'missing_candles': int(missing),
+                'duplicates': duplicates}
+
+    def load(self, symbol: str, interval: str) -> pd.DataFrame:
+        """Stored candles as a DataFrame shaped like get_btc_market_data's, de-duplicated"""
+        columns = self._load_columns(symbol, interval)
+        if not columns:
+            return pd.DataFrame()
+        df = pd.DataFrame(columns).drop_duplicates('open_time').sort_values('open_time')
+        df.insert(0, 'timestamp', pd.to_datetime(df.pop('open_time'), unit='ms'))
+        return df.reset_index(drop=True)
+
+
+@profiled_main('kline_backfill')
+def main():
+    parser = argparse.ArgumentParser(description="Parallel historical kline backfill")
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--days', type=float, default=30, help="How far back to backfill")
+    parser.add_argument('--out-dir', default='data/klines')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--weight-per-minute', type=int, default=3000)
+    parser.add_argument('--local', action='store_true', help="Run against the local stub kline server")
+    args = parser.parse_args()
+
+    server = None
+    try:
+        logger.info("Starting kline backfill")
+        base_url = BINANCE_API_URL
+        if args.local:
+            from Monitoring.local_exchange import LocalKlineServer
+            server = LocalKlineServer(latency=0.005).start()
+            base_url = server.url
+
+        backfill = KlineBackfill(out_dir=args.out_dir, base_url=base_url, workers=args.workers,
+                                 weight_per_minute=args.weight_per_minute)
+        end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        report = backfill.run(args.symbols, args.interval, end - timedelta(days=args.days), end)
+
+        print("\nBackfill Report:")
+        print("================")
+        print(f"Chunks: {report['chunks_downloaded']} downloaded, {report['chunks_skipped']} skipped, "
+              f"{len(report['chunks_failed'])} failed")
+        print(f"Candles: {report['candles']:,} in {report['seconds']:.1f}s "
+              f"({report['candles_per_second']:,.0f} candles/s, {report['requests']} requests)")
+        for symbol, result in report['validation'].items():
+            print(f"{symbol}: {result['candles']:,} candles, {len(result['gaps'])} gaps "
+                  f"({result['missing_candles']} missing), {result['duplicates']} duplicates")
+
+    except Exception as e:
+        logger.error(f"Main function error: {str(e)}")
+        raise
+    finally:
+        if server:
+            server.stop()
+
+if __name__ == "__main__":
+    main()
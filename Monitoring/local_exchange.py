@@ -0,0 +1,547 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+from binance.exceptions import BinanceAPIException
+
+logger = logging.getLogger(__name__)
+
+
+def api_error(code: int, msg: str, status_code: int = 400) -> BinanceAPIException:
+    """Build a BinanceAPIException the same way python-binance does from an HTTP error body"""
+    return BinanceAPIException(None, status_code, json.dumps({'code': code, 'msg': msg}))
+
+
+class LocalExchange:
+    """
+    In-memory stand-in for the Binance spot order endpoints.
+
+    Exposes the coroutine subset of `binance.AsyncClient` that the order manager and
+    user data stream use (`create_order`, `get_order`, `cancel_order`, `get_order_book`,
+    `get_symbol_ticker`, `get_account`, `get_open_orders`, `get_my_trades` and the
+    listen-key endpoints) and answers with Binance-shaped payloads. Market orders walk
+    a seeded price-level book so slippage is realistic; limit orders that do not cross
+    rest on the book until `add_liquidity` brings a counterparty. `fail_next` and
+    `latency` let tests exercise retries and timing without touching the real exchange.
+    """
+
+    def __init__(self, symbol: str = 'BTCUSDT', mid_price: float = 60000.0, tick_size: float = 0.5,
+                 levels: int = 50, level_qty: float = 0.05, latency: float = 0.0,
+                 commission_rate: float = 0.001, seed: Optional[int] = None,
+                 balances: Optional[Dict[str, float]] = None):
+        self.symbol = symbol
+        self.base_asset, self.quote_asset = symbol[:-4], symbol[-4:]
+        self.tick_size = Decimal(str(tick_size))
+        self.latency = latency
+        self.commission_rate = Decimal(str(commission_rate))
+        self.rng = random.Random(seed)
+
+        self.bids: List[List[Decimal]] = []  # [price, qty], best (highest) first
+        self.asks: List[List[Decimal]] = []  # [price, qty], best (lowest) first
+        self.orders: Dict[int, Dict] = {}
+        self.client_ids: Dict[str, int] = {}
+        self.resting: Dict[int, Dict] = {}
+        self.trades: List[Dict] = []
+        self.account_trades: List[Dict] = []
+        self.listeners = []
+        self.listen_keys: Dict[str, float] = {}
+        self.balances: Dict[str, Decimal] = {
+            asset: Decimal(str(amount))
+            for asset, amount in (balances or {self.base_asset: 0.0, self.quote_asset: 100000.0}).items()
+        }
+
+        self._next_order_id = 1
+        self._next_trade_id = 1
+        self._failures: List[BaseException] = []
+        self.seed_book(mid_price, levels, level_qty)
+
+    # ------------------------------------------------------------------ setup
+    def seed_book(self, mid_price: float, levels: int = 50, level_qty: float = 0.05):
+        """Replace the book with `levels` evenly spaced levels on each side of `mid_price`"""
+        mid = Decimal(str(mid_price))
+        qty = Decimal(str(level_qty))
+        self.bids = [[mid - self.tick_size * (i + 1), qty] for i in range(levels)]
+        self.asks = [[mid + self.tick_size * (i + 1), qty] for i in range(levels)]
+
+    def fail_next(self, count: int = 1, error: Optional[BaseException] = None, after_accept: bool = False):
+        """
+        Make the next `count` requests fail with a transient error.
+
+        With `after_accept` the order is still placed before the error is raised,
+        which mimics a response lost on the way back to the client.
+        """
+        for _ in range(count):
+            self._failures.append((error or api_error(-1001, 'Internal error; unable to process your request.', 500),
+                                   after_accept))
+
+    def add_listener(self, callback):
+        """Register `callback(event)` for user-data-stream events (executionReport, outboundAccountPosition)"""
+        self.listeners.append(callback)
+
+    async def _network(self):
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + self.rng.random()))
+
+    def _pop_failure(self):
+        return self._failures.pop(0) if self._failures else None
+
+    # -------------------------------------------------------------- matching
+    def _emit(self, order: Dict, execution_type: str, last_qty: Decimal = Decimal('0'),
+              last_price: Decimal = Decimal('0'), commission: Decimal = Decimal('0'),
+              trade_id: int = -1):
+        self._publish({
+            'e': 'executionReport',
+            'E': int(time.time() * 1000),
+            's': order['symbol'],
+            'c': order['clientOrderId'],
+            'S': order['side'],
+            'o': order['type'],
+            'f': order['timeInForce'],
+            'q': order['origQty'],
+            'p': order['price'],
+            'x': execution_type,
+            'X': order['status'],
+            'i': order['orderId'],
+            'l': str(last_qty),
+            'z': order['executedQty'],
+            'L': str(last_price),
+            'n': str(commission),
+            'N': self.quote_asset if commission else None,
+            'T': int(time.time() * 1000),
+            't': trade_id,
+            'Z': order['cummulativeQuoteQty'],
+        })
+
+    def _publish(self, event: Dict):
+        for callback in list(self.listeners):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Local exchange listener error: {str(e)}")
+
+    def _fill(self, order: Dict, price: Decimal, qty: Decimal):
+        executed = Decimal(order['executedQty']) + qty
+        quote = Decimal(order['cummulativeQuoteQty']) + price * qty
+        commission = qty * price * self.commission_rate
+        trade_id = self._next_trade_id
+        order['executedQty'] = str(executed)
+        order['cummulativeQuoteQty'] = str(quote)
+        order['fills'].append({
+            'price': str(price),
+            'qty': str(qty),
+            'commission': str(commission),
+            'commissionAsset': self.quote_asset,
+            'tradeId': trade_id,
+        })
+        self.trades.append({'id': self._next_trade_id, 'price': str(price), 'qty': str(qty),
+                            'time': int(time.time() * 1000), 'isBuyerMaker': order['side'] == 'SELL'})
+        self.account_trades.append({
+            'symbol': order['symbol'],
+            'id': trade_id,
+            'orderId': order['orderId'],
+            'price': str(price),
+            'qty': str(qty),
+            'quoteQty': str(price * qty),
+            'commission': str(commission),
+            'commissionAsset': self.quote_asset,
+            'time': int(time.time() * 1000),
+            'isBuyer': order['side'] == 'BUY',
+            'isMaker': False,
+        })
+        self._next_trade_id += 1
+        order['status'] = 'FILLED' if executed >= Decimal(order['origQty']) else 'PARTIALLY_FILLED'
+        order['updateTime'] = int(time.time() * 1000)
+
+        sign = 1 if order['side'] == 'BUY' else -1
+        self.balances[self.base_asset] = self.balances.get(self.base_asset, Decimal('0')) + sign * qty
+        self.balances[self.quote_asset] = self.balances.get(self.quote_asset, Decimal('0')) \
+            - sign * price * qty - commission
+        self._emit(order, 'TRADE', qty, price, commission, trade_id)
+        self._publish({
+            'e': 'outboundAccountPosition',
+            'E': int(time.time() * 1000),
+            'u': int(time.time() * 1000),
+            'B': [{'a': asset, 'f': str(self.balances[asset]), 'l': '0'}
+                  for asset in (self.base_asset, self.quote_asset)],
+        })
+
+    def _match(self, order: Dict, limit: Optional[Decimal]):
+        book = self.asks if order['side'] == 'BUY' else self.bids
+        remaining = Decimal(order['origQty']) - Decimal(order['executedQty'])
+        while remaining > 0 and book:
+            level_price, level_qty = book[0]
+            if limit is not None:
+                if order['side'] == 'BUY' and level_price > limit:
+                    break
+                if order['side'] == 'SELL' and level_price < limit:
+                    break
+            take = min(remaining, level_qty)
+            self._fill(order, level_price, take)
+            remaining -= take
+            if take == level_qty:
+                book.pop(0)
+            else:
+                book[0][1] = level_qty - take
+
+    def add_liquidity(self, side: str, price: float, qty: float):
+        """
+        Add resting liquidity on `side` ('BUY' adds a bid, 'SELL' adds an ask).
+
+        Incoming liquidity first trades against our resting limit orders on the other side.
+        """
+        price = Decimal(str(price))
+        qty = Decimal(str(qty))
+        for order_id in sorted(self.resting):
+            order = self.resting[order_id]
+            if qty <= 0:
+                break
+            limit = Decimal(order['price'])
+            crosses = (order['side'] == 'BUY' and side == 'SELL' and price <= limit) or \
+                      (order['side'] == 'SELL' and side == 'BUY' and price >= limit)
+            if not crosses:
+                continue
+            take = min(qty, Decimal(order['origQty']) - Decimal(order['executedQty']))
+            self._fill(order, limit, take)
+            qty -= take
+            if order['status'] == 'FILLED':
+                del self.resting[order_id]
+        if qty <= 0:
+            return
+        book = self.bids if side == 'BUY' else self.asks
+        book.append([price, qty])
+        book.sort(key=lambda level: -level[0] if side == 'BUY' else level[0])
+
+    # ------------------------------------------------------------ endpoints
+    async def create_order(self, **params) -> Dict:
+        await self._network()
+        failure = self._pop_failure()
+        if failure and not failure[1]:
+            raise failure[0]
+
+        client_order_id = params.get('newClientOrderId') or f"local-{self._next_order_id}"
+        if client_order_id in self.client_ids:
+            raise api_error(-2010, 'Duplicate order sent.')
+        symbol = params.get('symbol', self.symbol)
+        if symbol != self.symbol:
+            raise api_error(-1121, 'Invalid symbol.')
+        side = params['side']
+        order_type = params.get('type', 'MARKET')
+        quantity = Decimal(str(params['quantity']))
+        if quantity <= 0:
+            raise api_error(-1013, 'Filter failure: LOT_SIZE')
+        price = Decimal(str(params['price'])) if params.get('price') is not None else None
+        if order_type == 'LIMIT' and price is None:
+            raise api_error(-1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+
+        now = int(time.time() * 1000)
+        order = {
+            'symbol': symbol,
+            'orderId': self._next_order_id,
+            'clientOrderId': client_order_id,
+            'transactTime': now,
+            'updateTime': now,
+            'price': str(price) if price is not None else '0.00000000',
+            'origQty': str(quantity),
+            'executedQty': '0',
+            'cummulativeQuoteQty': '0',
+            'status': 'NEW',
+            'timeInForce': params.get('timeInForce', 'GTC'),
+            'type': order_type,
+            'side': side,
+            'fills': [],
+        }
+        self._next_order_id += 1
+        self.orders[order['orderId']] = order
+        self.client_ids[client_order_id] = order['orderId']
+        self._emit(order, 'NEW')
+
+        self._match(order, price if order_type == 'LIMIT' else None)
+        if order['status'] != 'FILLED':
+            if order_type == 'MARKET':
+                # Book exhausted: Binance expires the unfilled remainder of a market order
+                order['status'] = 'EXPIRED'
+                self._emit(order, 'EXPIRED')
+            elif order['timeInForce'] == 'IOC':
+                order['status'] = 'EXPIRED'
+                self._emit(order, 'EXPIRED')
+            else:
+                self.resting[order['orderId']] = order
+
+        if failure:
+            raise failure[0]
+        return dict(order, fills=list(order['fills']))
+
+    def _lookup(self, params: Dict) -> Dict:
+        order_id = params.get('orderId')
+        if order_id is None and params.get('origClientOrderId') is not None:
+            order_id = self.client_ids.get(params['origClientOrderId'])
+        if order_id not in self.orders:
+            raise api_error(-2013, 'Order does not exist.')
+        return self.orders[order_id]
+
+    async def get_order(self, **params) -> Dict:
+        await self._network()
+        failure = self._pop_failure()
+        if failure:
+            raise failure[0]
+        order = self._lookup(params)
+        return {k: v for k, v in order.items() if k != 'fills'}
+
+    async def cancel_order(self, **params) -> Dict:
+        await self._network()
+        order = self._lookup(params)
+        if order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+            raise api_error(-2011, 'Unknown order sent.')
+        order['status'] = 'CANCELED'
+        order['updateTime'] = int(time.time() * 1000)
+        self.resting.pop(order['orderId'], None)
+        self._emit(order, 'CANCELED')
+        return {k: v for k, v in order.items() if k != 'fills'}
+
+    async def get_order_book(self, **params) -> Dict:
+        await self._network()
+        limit = params.get('limit', 100)
+        return {
+            'lastUpdateId': self._next_trade_id,
+            'bids': [[str(p), str(q)] for p, q in self.bids[:limit]],
+            'asks': [[str(p), str(q)] for p, q in self.asks[:limit]],
+        }
+
+    async def get_symbol_ticker(self, **params) -> Dict:
+        await self._network()
+        if self.trades:
+            price = self.trades[-1]['price']
+        elif self.bids and self.asks:
+            price = str((self.bids[0][0] + self.asks[0][0]) / 2)
+        else:
+            raise api_error(-1121, 'No price available.')
+        return {'symbol': self.symbol, 'price': price}
+
+    async def get_open_orders(self, **params) -> List[Dict]:
+        await self._network()
+        return [{k: v for k, v in order.items() if k != 'fills'} for order in self.resting.values()]
+
+    async def get_my_trades(self, **params) -> List[Dict]:
+        await self._network()
+        trades = [t for t in self.account_trades
+                  if t['id'] >= params.get('fromId', 0) and t['time'] >= params.get('startTime', 0)]
+        return trades[:params.get('limit', 500)]
+
+    async def get_account(self, **params) -> Dict:
+        await self._network()
+        return {
+            'updateTime': int(time.time() * 1000),
+            'balances': [{'asset': asset, 'free': str(amount), 'locked': '0'}
+                         for asset, amount in self.balances.items()],
+        }
+
+    async def stream_get_listen_key(self) -> str:
+        await self._network()
+        listen_key = uuid.uuid4().hex
+        self.listen_keys[listen_key] = time.monotonic()
+        return listen_key
+
+    async def stream_keepalive(self, listenKey: str) -> Dict:
+        await self._network()
+        if listenKey not in self.listen_keys:
+            raise api_error(-1125, 'This listenKey does not exist.')
+        self.listen_keys[listenKey] = time.monotonic()
+        return {}
+
+    async def stream_close(self, listenKey: str) -> Dict:
+        await self._network()
+        self.listen_keys.pop(listenKey, None)
+        return {}
+
+    async def close_connection(self):
+        return None
+
+
+class LocalUserStreamServer:
+    """
+    WebSocket stand-in for the Binance user data stream.
+
+    Clients connect to `{url}/<listenKey>` and receive every executionReport and
+    outboundAccountPosition event produced by the attached `LocalExchange`.
+    """
+
+    def __init__(self, exchange: LocalExchange, host: str = '127.0.0.1', port: int = 0):
+        self.exchange = exchange
+        self.host = host
+        self.port = port
+        self.connections: Dict[object, str] = {}
+        self._server = None
+        exchange.add_listener(self._broadcast)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self) -> 'LocalUserStreamServer':
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        logger.info(f"Local user data stream listening on {self.url}")
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handler(self, websocket, path: Optional[str] = None):
+        # websockets>=14 passes only the connection and exposes the path on the request
+        path = path or getattr(websocket, 'path', None) or websocket.request.path
+        listen_key = path.rstrip('/').rsplit('/', 1)[-1]
+        if listen_key not in self.exchange.listen_keys:
+            await websocket.close(code=4001, reason='Invalid listen key')
+            return
+        self.connections[websocket] = listen_key
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.connections.pop(websocket, None)
+
+    def _broadcast(self, event: Dict):
+        message = json.dumps(event)
+        for websocket, listen_key in list(self.connections.items()):
+            if listen_key in self.exchange.listen_keys:
+                asyncio.ensure_future(self._send(websocket, message))
+
+    @staticmethod
+    async def _send(websocket, message: str):
+        try:
+            await websocket.send(message)
+        except Exception as e:
+            logger.warning(f"Dropping user stream message: {str(e)}")
+
+    async def expire(self, listen_key: str):
+        """Invalidate a listen key and notify its subscribers, as Binance does after 60 minutes"""
+        self.exchange.listen_keys.pop(listen_key, None)
+        message = json.dumps({'e': 'listenKeyExpired', 'E': int(time.time() * 1000), 'listenKey': listen_key})
+        for websocket, key in list(self.connections.items()):
+            if key == listen_key:
+                await self._send(websocket, message)
+
+
+class LocalKlineServer:
+    """
+    HTTP stand-in for `GET /api/v3/klines`.
+
+    Serves deterministic synthetic candles for any symbol and interval, reports
+    request weight in `X-MBX-USED-WEIGHT-1M` like Binance does, and can leave holes
+    (`missing` ranges of open times, e.g. an exchange outage) or answer 429 at
+    `throttle_rate` so gap detection and back-off can be exercised.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, weight_limit: int = 6000,
+                 missing: Optional[List[Tuple[int, int]]] = None, throttle_rate: float = 0.0,
+                 latency: float = 0.0, seed: int = 0):
+        self.weight_limit = weight_limit
+        self.missing = missing or []
+        self.throttle_rate = throttle_rate
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self._weights: List[Tuple[float, int]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'LocalKlineServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Local kline server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def candle(symbol: str, open_time: int, interval_ms: int) -> List:
+        """Deterministic random-walk candle; identical for every request of the same open time"""
+        rng = random.Random(f"{symbol}:{open_time}")
+        base = 30000 + 10000 * ((open_time // 86400000) % 7) / 7
+        open_price = base * (1 + rng.uniform(-0.01, 0.01))
+        close_price = open_price * (1 + rng.uniform(-0.002, 0.002))
+        high = max(open_price, close_price) * (1 + rng.uniform(0, 0.001))
+        low = min(open_price, close_price) * (1 - rng.uniform(0, 0.001))
+        volume = rng.uniform(1, 50)
+        trades = rng.randint(50, 2000)
+        return [open_time, f"{open_price:.2f}", f"{high:.2f}", f"{low:.2f}", f"{close_price:.2f}",
+                f"{volume:.5f}", open_time + interval_ms - 1, f"{volume * close_price:.2f}", trades,
+                f"{volume / 2:.5f}", f"{volume * close_price / 2:.2f}", "0"]
+
+    def _used_weight(self, weight: int) -> int:
+        with self._lock:
+            now = time.monotonic()
+            self._weights = [(t, w) for t, w in self._weights if now - t < 60]
+            self._weights.append((now, weight))
+            self.requests += 1
+            return sum(w for _, w in self._weights)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body, headers: Optional[Dict] = None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, str(value))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/api/v3/klines':
+                    return self._reply(404, {'code': -1, 'msg': 'Not found'})
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                used = server._used_weight(2)
+                headers = {'X-MBX-USED-WEIGHT-1M': used}
+                if server.latency:
+                    time.sleep(server.latency)
+                if used > server.weight_limit or server.rng.random() < server.throttle_rate:
+                    return self._reply(429, {'code': -1003, 'msg': 'Too many requests.'},
+                                       {**headers, 'Retry-After': 1})
+                try:
+                    from Monitoring.kline_backfill import interval_to_ms
+                    interval_ms = interval_to_ms(params['interval'])
+                    start = int(params['startTime'])
+                    end = int(params.get('endTime', start + 1000 * interval_ms))
+                    limit = min(int(params.get('limit', 500)), 1000)
+                except (KeyError, ValueError) as e:
+                    return self._reply(400, {'code': -1100, 'msg': f'Illegal parameter: {str(e)}'})
+
+                first = -(-start // interval_ms) * interval_ms
+                candles = []
+                for open_time in range(first, end + 1, interval_ms):
+                    if len(candles) >= limit:
+                        break
+                    if any(lo <= open_time < hi for lo, hi in server.missing):
+                        continue
+                    candles.append(server.candle(params['symbol'], open_time, interval_ms))
+                return self._reply(200, candles, headers)
+
+        return Handler
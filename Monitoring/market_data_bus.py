@@ -0,0 +1,384 @@
+import time
+import logging
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from Monitoring.profiling import profiled_main, span
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TOPICS = ('ticker', 'trades', 'order_book', 'klines', 'news', 'tweets', 'sentiment')
+POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+def freeze(payload: Any) -> Any:
+    """
+    Read-only version of a payload, built once per publish and shared by every subscriber.
+
+    numpy arrays are marked non-writeable in place. A DataFrame becomes a read-only
+    mapping of column name to a non-writeable numpy array (one copy per publish, none
+    per subscriber). Dicts become `MappingProxyType` and lists become tuples,
+    recursively. A subscriber that wants to modify the data takes its own copy,
+    e.g. with `as_dataframe`.
+    """
+    if isinstance(payload, np.ndarray):
+        payload.flags.writeable = False
+        return payload
+    if isinstance(payload, pd.DataFrame):
+        return MappingProxyType({column: freeze(payload[column].to_numpy(copy=True)) for column in payload})
+    if isinstance(payload, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(value) for key, value in payload.items()})
+    if isinstance(payload, (list, tuple)):
+        return tuple(freeze(value) for value in payload)
+    return payload
+
+
+def as_dataframe(payload) -> pd.DataFrame:
+    """Private, writable DataFrame copy of a frozen columnar payload"""
+    return pd.DataFrame({column: np.array(values) for column, values in payload.items()})
+
+
+class Message:
+    """One published item; the payload object is shared, never copied, across subscribers"""
+    __slots__ = ('topic', 'seq', 'published_at', 'payload')
+
+    def __init__(self, topic: str, seq: int, published_at: float, payload: Any):
+        self.topic = topic
+        self.seq = seq
+        self.published_at = published_at
+        self.payload = payload
+
+    def __repr__(self):
+        return f"Message(topic={self.topic!r}, seq={self.seq})"
+
+
+class Subscription:
+    """
+    Bounded per-subscriber queue.
+
+    `drop_oldest` evicts the oldest queued message when full, `drop_newest` discards
+    the incoming one, and `block` makes the publisher wait up to `block_timeout`
+    (backpressure) before dropping.
+    """
+
+    def __init__(self, name: str, topics: Iterable[str], maxsize: int = 100,
+                 policy: str = 'drop_oldest', block_timeout: float = 1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}; expected one of {POLICIES}")
+        self.name = name
+        self.topics = set(topics)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.closed = False
+
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self.delivered = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def _offer(self, message: Message) -> bool:
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._queue) >= self.maxsize:
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                else:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.maxsize and not self.closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            logger.warning(f"Subscriber {self.name} too slow, dropping {message}")
+                            return False
+                        self._cond.wait(remaining)
+                    if self.closed:
+                        return False
+            self._queue.append(message)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Message]:
+        """Next message, or None on timeout / after close"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.closed, timeout):
+                return None
+            if not self._queue:
+                return None
+            message = self._queue.popleft()
+            self._cond.notify_all()
+        lag = time.monotonic() - message.published_at
+        self.delivered += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self._lag_total += lag
+        return message
+
+    def __iter__(self):
+        while True:
+            message = self.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            depth = len(self._queue)
+            oldest = time.monotonic() - self._queue[0].published_at if self._queue else 0.0
+        return {
+            'subscriber': self.name,
+            'policy': self.policy,
+            'queue_depth': depth,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'last_lag_ms': self.last_lag * 1000,
+            'avg_lag_ms': self._lag_total / self.delivered * 1000 if self.delivered else 0.0,
+            'max_lag_ms': self.max_lag * 1000,
+            'oldest_queued_ms': oldest * 1000,
+        }
+
+
+class MarketDataBus:
+    """
+    In-process publish/subscribe fan-out for market data.
+
+    One upstream feed publishes each item once; it is frozen (see `freeze`) and every
+    subscriber to that topic receives a reference to the same read-only payload. The latest message per topic
+    is retained so new subscribers (or strategies that only need the current state)
+    can read it without waiting for the next publish.
+    """
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._latest: Dict[str, Message] = {}
+        self._seq: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.published: Dict[str, int] = {}
+
+    def subscribe(self, name: str, topics: Iterable[str] = TOPICS, maxsize: int = 100,
+                  policy: str = 'drop_oldest', block_timeout: float = 1.0,
+                  callback: Optional[Callable[[Message], None]] = None) -> Subscription:
+        """
+        Register a subscriber; with `callback` a worker thread drains the queue and calls it.
+        """
+        subscription = Subscription(name, topics, maxsize, policy, block_timeout)
+        if callback is not None:
+            subscription._thread = threading.Thread(target=self._run_callback, args=(subscription, callback),
+                                                    name=f"bus-{name}", daemon=True)
+            subscription._thread.start()
+        with self._lock:
+            self._subscriptions.append(subscription)
+        logger.info(f"Subscriber {name} registered for {sorted(subscription.topics)} ({policy})")
+        return subscription
+
+    @staticmethod
+    def _run_callback(subscription: Subscription, callback: Callable[[Message], None]):
+        for message in subscription:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Subscriber {subscription.name} callback error: {str(e)}")
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+        subscription.close()
+
+    def publish(self, topic: str, payload: Any) -> Optional[Message]:
+        """Fan a payload out to every subscriber of `topic`; empty payloads are skipped"""
+        if payload is None or (isinstance(payload, pd.DataFrame) and payload.empty) or \
+                (isinstance(payload, (dict, list)) and not payload):
+            return None
+        with self._lock:
+            seq = self._seq.get(topic, 0) + 1
+            self._seq[topic] = seq
+            message = Message(topic, seq, time.monotonic(), freeze(payload))
+            self._latest[topic] = message
+            self.published[topic] = self.published.get(topic, 0) + 1
+            subscribers = [s for s in self._subscriptions if topic in s.topics]
+        for subscription in subscribers:
+            subscription._offer(message)
+        return message
+
+    def latest(self, topic: str) -> Optional[Message]:
+        return self._latest.get(topic)
+
+    def metrics(self) -> pd.DataFrame:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return pd.DataFrame([s.metrics() for s in subscriptions])
+
+    def close(self):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class FeedPoller:
+    """
+    Single upstream feed: polls the existing monitors on their own schedules and
+    publishes the results to the bus, so N strategies cost one set of API calls.
+
+    Any source can be left out; `intervals` sets the seconds between polls per topic.
+    With both `x_news` and `sentiment_index`, every tweets poll folds tweets not seen
+    before into the index using `sentiment_scorer` (text -> score in [-1, 1], default
+    the local lexicon), so the `sentiment` topic tracks the published tweets.
+    """
+
+    DEFAULT_INTERVALS = {
+        'ticker': 5.0,
+        'trades': 5.0,
+        'order_book': 2.0,
+        'klines': 60.0,
+        'tweets': 900.0,
+        'news': 1800.0,
+        'sentiment': 60.0,
+    }
+
+    def __init__(self, bus: MarketDataBus, binance=None, x_news=None, deepsearch=None,
+                 sentiment_index=None, intervals: Optional[Dict[str, float]] = None,
+                 symbol: str = 'BTCUSDT', kline_interval: str = '1m',
+                 sentiment_scorer: Optional[Callable[[str], float]] = None):
+        self.bus = bus
+        self.symbol = symbol
+        self.intervals = {**self.DEFAULT_INTERVALS, **(intervals or {})}
+        self.sources: Dict[str, Callable[[], Any]] = {}
+        self.sentiment_index = sentiment_index
+        self.sentiment_scorer = sentiment_scorer
+        self._tweets_seen_until = None
+        if binance is not None:
+            self.sources['ticker'] = binance.get_btc_price
+            self.sources['trades'] = lambda: binance.get_recent_trades(symbol=symbol)
+            self.sources['order_book'] = lambda: binance.get_order_book(symbol=symbol)
+            self.sources['klines'] = lambda: binance.get_klines(symbol=symbol, interval=kline_interval)
+        if x_news is not None:
+            if sentiment_index is not None:
+                self.sources['tweets'] = lambda: self._fold_tweets(x_news.search_crypto_news())
+                if self.sentiment_scorer is None:
+                    from AICalculation.model_router import LexiconScorer
+                    from AICalculation.sentiment_index import sentiment_to_score
+                    lexicon = LexiconScorer()
+                    self.sentiment_scorer = lambda text: sentiment_to_score(lexicon.analyze_crypto_sentiment(text))
+            else:
+                self.sources['tweets'] = x_news.search_crypto_news
+        if deepsearch is not None:
+            self.sources['news'] = lambda: deepsearch.parse_news_data(deepsearch.get_btc_news())
+        if sentiment_index is not None:
+            self.sources['sentiment'] = sentiment_index.snapshot
+        self._next_due = {topic: 0.0 for topic in self.sources}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _fold_tweets(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Update the sentiment index with tweets newer than any already folded in"""
+        if df.empty:
+            return df
+        new = df if self._tweets_seen_until is None else df[df['created_at'] > self._tweets_seen_until]
+        if not new.empty:
+            self.sentiment_index.update_from_tweets(new, self.sentiment_scorer)
+            self._tweets_seen_until = new['created_at'].max()
+        return df
+
+    def run_once(self) -> List[str]:
+        """Poll and publish every topic that is due; returns the topics published"""
+        published = []
+        now = time.monotonic()
+        for topic, fetch in self.sources.items():
+            if now < self._next_due[topic]:
+                continue
+            self._next_due[topic] = now + self.intervals.get(topic, 60.0)
+            try:
+                with span(f"bus.poll.{topic}"):
+                    payload = fetch()
+            except Exception as e:
+                logger.error(f"Feed poll failed for {topic}: {str(e)}")
+                continue
+            if self.bus.publish(topic, payload):
+                published.append(topic)
+        return published
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            wait = min(self._next_due.values(), default=time.monotonic() + 1) - time.monotonic()
+            self._stop.wait(max(wait, 0.05))
+
+    def start(self) -> 'FeedPoller':
+        self._thread = threading.Thread(target=self._loop, name='feed-poller', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+
+@profiled_main('market_data_bus')
+def main():
+    try:
+        from Monitoring.binance_monitor import BinanceMonitor
+
+        logger.info("Starting market data bus with three demo strategies")
+        bus = MarketDataBus()
+        poller = FeedPoller(bus, binance=BinanceMonitor(),
+                            intervals={'ticker': 1.0, 'trades': 1.0, 'order_book': 0.5})
+
+        prices = []
+        bus.subscribe('momentum', topics=['ticker'],
+                      callback=lambda m: prices.append(m.payload['price']))
+        bus.subscribe('book_watcher', topics=['order_book'], maxsize=10, policy='drop_oldest',
+                      callback=lambda m: None)
+        # Deliberately slow consumer to show backpressure and lag reporting
+        bus.subscribe('slow_tape', topics=['trades'], maxsize=2, policy='block', block_timeout=0.1,
+                      callback=lambda m: time.sleep(1.5))
+
+        poller.start()
+        time.sleep(10)
+        poller.stop()
+
+        print("\nPublished per topic:")
+        print("====================")
+        for topic, count in bus.published.items():
+            print(f"{topic}: {count}")
+        print("\nSubscriber metrics:")
+        print("===================")
+        print(bus.metrics().to_string(index=False))
+        if prices:
+            print(f"\nmomentum saw {len(prices)} ticks, last ${prices[-1]:,.2f}")
+        bus.close()
+
+    except Exception as e:
+        logger.error(f"Main function error: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    main()
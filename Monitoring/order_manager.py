@@ -0,0 +1,421 @@
+import time
+import uuid
+import asyncio
+import logging
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, List, Optional
+
+import aiohttp
+from binance.exceptions import BinanceAPIException
+
+from Monitoring.profiling import profiled_main, span
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Binance error codes that are safe to retry: internal error, rate limit, backend timeout, timestamp skew
+TRANSIENT_ERROR_CODES = {-1001, -1003, -1007, -1021}
+FINAL_STATUSES = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'}
+# New order rejected; Binance also returns this for a reused client order id ("Duplicate order sent.")
+DUPLICATE_ORDER_CODE = -2010
+# Tracked status of an order whose placement could not be confirmed either way
+UNKNOWN_STATUS = 'UNKNOWN'
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed request may be retried with the same client order id"""
+    if isinstance(error, BinanceAPIException):
+        return error.code in TRANSIENT_ERROR_CODES or error.status_code in (429, 500, 502, 503, 504)
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError, aiohttp.ClientError))
+
+
+def average_fill_price(order: Dict) -> float:
+    """
+    Volume-weighted fill price of an order.
+
+    Market orders report `price` as 0, so the fill price has to come from
+    `cummulativeQuoteQty / executedQty` (or the individual fills).
+    """
+    executed = float(order.get('executedQty', 0) or 0)
+    if executed > 0:
+        return float(order.get('cummulativeQuoteQty', 0) or 0) / executed
+    fills = order.get('fills') or []
+    qty = sum(float(f['qty']) for f in fills)
+    return sum(float(f['price']) * float(f['qty']) for f in fills) / qty if qty else 0.0
+
+
+class OrderManager:
+    """
+    Asynchronous order execution with sliced (TWAP/iceberg) parent orders.
+
+    Works with `binance.AsyncClient` or any object exposing the same coroutines,
+    such as `LocalExchange`. Every child order carries a client order id generated
+    before the first attempt; a transient failure is resolved by looking the id up
+    on the exchange before re-sending, so retries never double-fill. An order whose
+    placement cannot be confirmed either way is tracked as UNKNOWN and is never
+    re-sent; `reconcile` resolves it later.
+    """
+
+    def __init__(self, client, symbol: str = 'BTCUSDT', step_size: float = 0.00001,
+                 max_retries: int = 3, retry_backoff: float = 0.2, request_timeout: float = 10.0,
+                 poll_interval: float = 0.5, id_prefix: str = 'mmc'):
+        self.client = client
+        self.symbol = symbol
+        self.step_size = Decimal(str(step_size))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.request_timeout = request_timeout
+        self.poll_interval = poll_interval
+        self.id_prefix = id_prefix
+
+        self.orders: Dict[str, Dict] = {}         # client order id -> latest order payload
+        self.order_ids: Dict[int, str] = {}       # exchange order id -> client order id
+        self.executions: List[Dict] = []          # completed parent order reports
+
+    # --------------------------------------------------------------- helpers
+    def new_client_order_id(self) -> str:
+        # Binance accepts up to 36 characters matching ^[a-zA-Z0-9-_]{1,36}$
+        return f"{self.id_prefix}-{uuid.uuid4().hex[:24]}"
+
+    def round_qty(self, quantity) -> Decimal:
+        return (Decimal(str(quantity)) / self.step_size).to_integral_value(ROUND_DOWN) * self.step_size
+
+    def _track(self, order: Dict) -> Dict:
+        client_order_id = order.get('clientOrderId')
+        if client_order_id:
+            self.orders[client_order_id] = {**self.orders.get(client_order_id, {}), **order}
+            if order.get('orderId') is not None:
+                self.order_ids[order['orderId']] = client_order_id
+        return self.orders.get(client_order_id, order)
+
+    def on_execution_report(self, event: Dict):
+        """Apply a user-data-stream executionReport to the tracked orders"""
+        client_order_id = event.get('c')
+        if client_order_id not in self.orders:
+            return
+        self._track({
+            'clientOrderId': client_order_id,
+            'orderId': event.get('i'),
+            'status': event.get('X'),
+            'executedQty': event.get('z'),
+            'cummulativeQuoteQty': event.get('Z'),
+        })
+
+    async def _call(self, method: str, **params) -> Dict:
+        return await asyncio.wait_for(getattr(self.client, method)(symbol=self.symbol, **params),
+                                      timeout=self.request_timeout)
+
+    async def get_reference_price(self) -> float:
+        """Mid price at decision time, used as the slippage benchmark"""
+        try:
+            depth = await self._call('get_order_book', limit=5)
+            if depth['bids'] and depth['asks']:
+                return (float(depth['bids'][0][0]) + float(depth['asks'][0][0])) / 2
+        except Exception as e:
+            logger.warning(f"Could not fetch order book for reference price: {str(e)}")
+        ticker = await self._call('get_symbol_ticker')
+        return float(ticker['price'])
+
+    # ---------------------------------------------------------------- orders
+    async def submit(self, side: str, quantity, order_type: str = 'MARKET', price: Optional[float] = None,
+                     client_order_id: Optional[str] = None, time_in_force: str = 'GTC') -> Dict:
+        """
+        Place one order idempotently and return the tracked order payload.
+
+        Re-submitting with a client order id that is already tracked returns the
+        existing order instead of sending a new one.
+        """
+        client_order_id = client_order_id or self.new_client_order_id()
+        if client_order_id in self.orders:
+            logger.info(f"Order {client_order_id} already submitted, skipping duplicate")
+            return self.orders[client_order_id]
+
+        qty = self.round_qty(quantity)
+        if qty <= 0:
+            raise ValueError(f"Quantity {quantity} rounds to zero with step size {self.step_size}")
+        params = {
+            'side': side.upper(),
+            'type': order_type,
+            'quantity': format(qty, 'f'),
+            'newClientOrderId': client_order_id,
+            'newOrderRespType': 'FULL',
+        }
+        if order_type == 'LIMIT':
+            params['price'] = format(Decimal(str(price)), 'f')
+            params['timeInForce'] = time_in_force
+        self.orders[client_order_id] = {'clientOrderId': client_order_id, 'status': 'PENDING_NEW',
+                                        'side': params['side'], 'origQty': params['quantity'],
+                                        'executedQty': '0', 'cummulativeQuoteQty': '0'}
+
+        last_error: Optional[BaseException] = None
+        confirmed_missing = False
+        for attempt in range(self.max_retries + 1):
+            stop = False
+            try:
+                with span('orders.create_order'):
+                    order = await self._call('create_order', **params)
+                return self._track(order)
+            except Exception as e:
+                # On a retry, -2010 usually means an earlier attempt already placed the order
+                duplicate = attempt > 0 and isinstance(e, BinanceAPIException) and e.code == DUPLICATE_ORDER_CODE
+                if not duplicate and not is_transient(e):
+                    if attempt == 0:
+                        self._finish(client_order_id, 'REJECTED', e)
+                        raise
+                    # An earlier attempt may still have been accepted; look it up once more, then stop
+                    stop = True
+                last_error = e
+                logger.warning(f"{'Duplicate' if duplicate else 'Transient'} error on order {client_order_id} "
+                               f"({attempt + 1}/{self.max_retries + 1}): {str(e)}")
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+            # The request may have reached the exchange; adopt it instead of re-sending
+            try:
+                existing = await self._fetch(client_order_id)
+            except Exception as e:
+                logger.warning(f"Could not look up order {client_order_id}: {str(e)}")
+                confirmed_missing = False
+                if stop:
+                    break
+                continue
+            if existing:
+                logger.info(f"Order {client_order_id} was accepted before the error, adopting it")
+                return existing
+            confirmed_missing = True
+            if duplicate or stop:
+                # The exchange does not know the id, so the error was a genuine rejection
+                break
+        # Only an order the exchange confirmed it does not know is REJECTED; otherwise it may be live
+        self._finish(client_order_id, 'REJECTED' if confirmed_missing else UNKNOWN_STATUS, last_error)
+        raise last_error
+
+    def _finish(self, client_order_id: str, status: str, error: BaseException):
+        self.orders[client_order_id]['status'] = status
+        if status == UNKNOWN_STATUS:
+            logger.error(f"Order {client_order_id} outcome unknown, not re-sending: {str(error)}")
+        else:
+            logger.error(f"Order {client_order_id} failed: {str(error)}")
+
+    async def reconcile(self, children: List[Dict]) -> Decimal:
+        """
+        Resolve UNKNOWN orders in `children` against the exchange, in place.
+
+        Returns the quantity the exchange confirmed it never received; orders that
+        still cannot be looked up stay UNKNOWN and are never re-sent.
+        """
+        released = Decimal('0')
+        for i, order in enumerate(children):
+            if order.get('status') != UNKNOWN_STATUS:
+                continue
+            client_order_id = order['clientOrderId']
+            try:
+                found = await self._fetch(client_order_id)
+            except Exception as e:
+                logger.warning(f"Order {client_order_id} still unresolved: {str(e)}")
+                continue
+            if found:
+                logger.info(f"Order {client_order_id} resolved as {found.get('status')}")
+                children[i] = found
+            else:
+                self.orders[client_order_id]['status'] = 'REJECTED'
+                released += Decimal(order['origQty'])
+        return released
+
+    async def _fetch(self, client_order_id: str) -> Optional[Dict]:
+        """Order from the exchange, None if it does not know the id; other errors propagate"""
+        try:
+            order = await self._call('get_order', origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == -2013:
+                return None
+            raise
+        return self._track(order)
+
+    async def query(self, client_order_id: str) -> Optional[Dict]:
+        """Refresh an order from the exchange; None if it is unknown or the lookup failed"""
+        try:
+            return await self._fetch(client_order_id)
+        except Exception as e:
+            logger.warning(f"Could not query order {client_order_id}: {str(e)}")
+            return None
+
+    async def cancel(self, client_order_id: str) -> Optional[Dict]:
+        try:
+            order = await self._call('cancel_order', origClientOrderId=client_order_id)
+            return self._track(order)
+        except BinanceAPIException as e:
+            # -2011: already filled or cancelled, the final state comes from query()
+            if e.code != -2011:
+                logger.error(f"Failed to cancel order {client_order_id}: {str(e)}")
+            return await self.query(client_order_id)
+
+    async def wait_for_fill(self, client_order_id: str, timeout: float) -> Dict:
+        """Poll until the order reaches a final status or `timeout` elapses, then cancel it"""
+        deadline = time.monotonic() + timeout
+        order = self.orders[client_order_id]
+        while order.get('status') not in FINAL_STATUSES and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            order = await self.query(client_order_id) or order
+        if order.get('status') not in FINAL_STATUSES:
+            order = await self.cancel(client_order_id) or order
+        return order
+
+    # ----------------------------------------------------------- algorithms
+    def _report(self, algo: str, side: str, target, reference_price: float,
+                children: List[Dict], started: float) -> Dict:
+        executed = sum(float(o.get('executedQty', 0) or 0) for o in children)
+        quote = sum(float(o.get('cummulativeQuoteQty', 0) or 0) for o in children)
+        avg_price = quote / executed if executed else 0.0
+        sign = 1 if side.upper() == 'BUY' else -1
+        slippage_bps = sign * (avg_price - reference_price) / reference_price * 10000 \
+            if executed and reference_price else 0.0
+        report = {
+            'algo': algo,
+            'side': side.lower(),
+            'target_qty': float(target),
+            'executed_qty': executed,
+            'avg_price': avg_price,
+            'reference_price': reference_price,
+            'slippage_bps': slippage_bps,
+            'latency_ms': (time.monotonic() - started) * 1000,
+            'child_orders': [o.get('clientOrderId') for o in children],
+            'unresolved_orders': [o.get('clientOrderId') for o in children if o.get('status') == UNKNOWN_STATUS],
+        }
+        self.executions.append(report)
+        logger.info(f"{algo.upper()} {side} {executed:.8f}/{float(target):.8f} @ {avg_price:,.2f} "
+                    f"(slippage {slippage_bps:.2f} bps, {report['latency_ms']:.0f} ms)")
+        return report
+
+    async def market(self, side: str, quantity) -> Dict:
+        """Single market order with the same reporting as the sliced algorithms"""
+        started = time.monotonic()
+        reference = await self.get_reference_price()
+        order = await self.submit(side, quantity)
+        return self._report('market', side, quantity, reference, [order], started)
+
+    async def twap(self, side: str, quantity, slices: int = 5, duration: float = 60.0,
+                   limit_price: Optional[float] = None) -> Dict:
+        """
+        Split `quantity` into `slices` child orders spread evenly over `duration` seconds.
+
+        Child orders are market orders, or IOC limit orders when `limit_price` is set.
+        """
+        if slices < 1:
+            raise ValueError("slices must be >= 1")
+        total = self.round_qty(quantity)
+        if total <= 0:
+            raise ValueError(f"Quantity {quantity} rounds to zero with step size {self.step_size}")
+        # Never cut slices smaller than one lot
+        max_slices = int(total / self.step_size)
+        if slices > max_slices:
+            logger.warning(f"TWAP of {total} only allows {max_slices} slices of {self.step_size}, "
+                           f"using {max_slices} instead of {slices}")
+            slices = max_slices
+        child_qty = self.round_qty(total / slices)
+        interval = duration / slices if slices > 1 else 0.0
+        started = time.monotonic()
+        reference = await self.get_reference_price()
+
+        children, sent = [], Decimal('0')
+        for i in range(slices):
+            if i == slices - 1:
+                # Settle earlier slices of unknown outcome first so the remainder never re-sends them
+                sent -= await self.reconcile(children)
+                qty = total - sent
+            else:
+                qty = child_qty
+            if qty <= 0:
+                break
+            client_order_id = self.new_client_order_id()
+            try:
+                if limit_price is None:
+                    order = await self.submit(side, qty, client_order_id=client_order_id)
+                else:
+                    order = await self.submit(side, qty, order_type='LIMIT', price=limit_price,
+                                              client_order_id=client_order_id, time_in_force='IOC')
+                children.append(order)
+                sent += qty
+            except Exception as e:
+                logger.error(f"TWAP slice {i + 1}/{slices} failed: {str(e)}")
+                if self.orders.get(client_order_id, {}).get('status') == UNKNOWN_STATUS:
+                    children.append(self.orders[client_order_id])
+                    sent += qty
+            if i < slices - 1:
+                await asyncio.sleep(interval)
+        await self.reconcile(children)
+        return self._report('twap', side, total, reference, children, started)
+
+    async def iceberg(self, side: str, quantity, visible_qty, limit_price: float,
+                      slice_timeout: float = 30.0) -> Dict:
+        """
+        Work `quantity` as a sequence of `visible_qty` limit orders at `limit_price`.
+
+        The next clip is only shown once the previous one is done; a clip that does not
+        fill within `slice_timeout` is cancelled and the remainder is abandoned.
+        """
+        started = time.monotonic()
+        reference = await self.get_reference_price()
+        remaining = self.round_qty(quantity)
+        visible = self.round_qty(visible_qty)
+        if visible <= 0:
+            raise ValueError("visible_qty rounds to zero")
+
+        children = []
+        while remaining > 0:
+            clip = min(visible, remaining)
+            order = await self.submit(side, clip, order_type='LIMIT', price=limit_price)
+            order = await self.wait_for_fill(order['clientOrderId'], slice_timeout)
+            children.append(order)
+            filled = Decimal(str(order.get('executedQty', 0) or 0))
+            remaining -= filled
+            if order.get('status') != 'FILLED':
+                logger.warning(f"Iceberg clip {order['clientOrderId']} ended {order.get('status')}, "
+                               f"stopping with {remaining} left")
+                break
+        return self._report('iceberg', side, quantity, reference, children, started)
+
+
+async def run_demo():
+    """Run a TWAP and an iceberg against the local exchange stand-in"""
+    from Monitoring.local_exchange import LocalExchange
+
+    exchange = LocalExchange(latency=0.005, seed=7)
+    manager = OrderManager(exchange, poll_interval=0.01)
+    exchange.fail_next(1, after_accept=True)
+
+    await manager.market('buy', 0.01)
+    await manager.twap('buy', 0.2, slices=4, duration=0.2)
+
+    async def counterparty():
+        for _ in range(6):
+            await asyncio.sleep(0.02)
+            exchange.add_liquidity('SELL', 59990.0, 0.02)
+
+    best_bid = float(exchange.bids[0][0])
+    await asyncio.gather(manager.iceberg('buy', 0.1, visible_qty=0.02, limit_price=best_bid,
+                                         slice_timeout=1.0),
+                         counterparty())
+    return manager.executions
+
+
+@profiled_main('order_manager')
+def main():
+    try:
+        logger.info("Starting order manager demo against the local exchange")
+        for report in asyncio.run(run_demo()):
+            print(f"\n{report['algo'].upper()} {report['side']}")
+            print("=" * 20)
+            print(f"Executed: {report['executed_qty']:.8f} / {report['target_qty']:.8f} BTC")
+            print(f"Average Price: ${report['avg_price']:,.2f}")
+            print(f"Slippage: {report['slippage_bps']:.2f} bps")
+            print(f"Latency: {report['latency_ms']:.1f} ms")
+            print(f"Child Orders: {len(report['child_orders'])}")
+    except Exception as e:
+        logger.error(f"Main function error: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    main()
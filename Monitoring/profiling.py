@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# MONITOR_PROFILE=all (or 1) enables everything; otherwise a comma list of cpu,sample,memory,spans
+PROFILE_ENV = 'MONITOR_PROFILE'
+PROFILE_DIR_ENV = 'MONITOR_PROFILE_DIR'
+PROFILE_MODES = ('cpu', 'sample', 'memory', 'spans')
+
+_active: Optional['ProfileSession'] = None
+
+
+def enabled_modes(value: Optional[str] = None) -> List[str]:
+    value = (os.getenv(PROFILE_ENV, '') if value is None else value).strip().lower()
+    if not value or value in ('0', 'false', 'off', 'no'):
+        return []
+    if value in ('1', 'true', 'on', 'yes', 'all'):
+        return list(PROFILE_MODES)
+    modes = [mode.strip() for mode in value.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in PROFILE_MODES]
+    if unknown:
+        logger.warning(f"Ignoring unknown profile modes: {unknown}")
+    return [mode for mode in modes if mode in PROFILE_MODES]
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """
+    One profiling run of an entry point.
+
+    Depending on the enabled modes it collects a cProfile trace (`.pstats`) of the
+    calling thread and of every thread started during the session, a sampled
+    wall-clock profile of every thread (`.collapsed`, one `a;b;c count` line per
+    stack), tracemalloc top-N allocation sites (`.alloc.txt`), and `span()` timings.
+    Spans are grouped per thread and per asyncio task, so concurrent coroutines get
+    separate, properly nested tracks. Samples and spans are also written to a
+    speedscope `.speedscope.json` file that can be opened at https://www.speedscope.app.
+    """
+
+    def __init__(self, name: str, modes: List[str], out_dir: str = 'profiles',
+                 sample_interval: float = 0.005, top_n: int = 25):
+        self.name = name
+        self.modes = set(modes)
+        self.out_dir = out_dir
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+
+        self.samples: Counter = Counter()
+        self.spans: Dict[str, List] = {}   # thread / task track -> [(kind, span name, time)]
+        self.span_totals: Counter = Counter()
+        self._span_lock = threading.Lock()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started = 0.0
+
+    # ---------------------------------------------------------------- control
+    def start(self) -> 'ProfileSession':
+        self._started = time.perf_counter()
+        if 'memory' in self.modes:
+            tracemalloc.start(10)
+        if 'sample' in self.modes:
+            self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+            self._sampler.start()
+        if 'cpu' in self.modes:
+            # Threads started from now on (worker pools, cache refreshes) get their own profiler
+            threading.setprofile(self._thread_profile_hook)
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        logger.info(f"Profiling {self.name} with modes: {', '.join(sorted(self.modes))}")
+        return self
+
+    def stop(self) -> Dict[str, str]:
+        if self._profiler:
+            self._profiler.disable()
+            threading.setprofile(None)
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        elapsed = time.perf_counter() - self._started
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        prefix = os.path.join(self.out_dir, f"{self.name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        outputs = {}
+        if self._profiler:
+            outputs['cpu'] = f"{prefix}.pstats"
+            stats = pstats.Stats(self._profiler)
+            with self._span_lock:
+                profilers = list(self._thread_profilers)
+            for profiler in profilers:
+                stats.add(profiler)
+            stats.dump_stats(outputs['cpu'])
+            if profilers:
+                logger.info(f"CPU profile merged from {len(profilers) + 1} threads")
+        if 'memory' in self.modes:
+            outputs['memory'] = f"{prefix}.alloc.txt"
+            self._write_allocations(outputs['memory'])
+            tracemalloc.stop()
+        if self.samples:
+            outputs['collapsed'] = f"{prefix}.collapsed"
+            with open(outputs['collapsed'], 'w', encoding='utf-8') as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        if self.samples or self.spans:
+            outputs['speedscope'] = f"{prefix}.speedscope.json"
+            self._write_speedscope(outputs['speedscope'], elapsed)
+
+        logger.info(f"Profile of {self.name} finished in {elapsed:.3f}s")
+        for span_name, total in self.span_totals.most_common(10):
+            logger.info(f"  span {span_name}: {total * 1000:.1f} ms")
+        for kind, path in outputs.items():
+            logger.info(f"  {kind} profile written to {path}")
+        return outputs
+
+    # ------------------------------------------------------------- collection
+    def _thread_profile_hook(self, frame, event, arg):
+        # Runs once at the start of each new thread; enable() replaces this hook for that thread
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            sys.setprofile(None)
+            logger.warning(f"Cannot profile thread {threading.current_thread().name}: {str(e)}")
+            return
+        with self._span_lock:
+            self._thread_profilers.append(profiler)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def record_span(self, kind: str, span_name: str, at: float):
+        track = threading.current_thread().name
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            # Coroutines interleave on one thread; each task gets its own nested track
+            track = f"{track} / {task.get_name()} ({id(task):x})"
+        with self._span_lock:
+            self.spans.setdefault(track, []).append((kind, span_name, at - self._started))
+
+    def _write_allocations(self, path: str):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, cProfile.__file__),
+        ])
+        stats = snapshot.statistics('lineno')[:self.top_n]
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"current={current / 1024:.1f} KiB peak={peak / 1024:.1f} KiB\n\n")
+            for stat in stats:
+                f.write(f"{stat}\n")
+        logger.info(f"Memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB")
+        for stat in stats[:5]:
+            logger.info(f"  {stat}")
+
+    def _write_speedscope(self, path: str, elapsed: float):
+        frames, index = [], {}
+
+        def frame_id(label: str) -> int:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            return index[label]
+
+        profiles = []
+        for track, events in self.spans.items():
+            profiles.append({
+                'type': 'evented',
+                'name': f"spans ({track})",
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': elapsed,
+                'events': [{'type': kind, 'frame': frame_id(span_name), 'at': at}
+                           for kind, span_name, at in events],
+            })
+        if self.samples:
+            stacks = list(self.samples.items())
+            profiles.append({
+                'type': 'sampled',
+                'name': f"{self.name} samples",
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': elapsed,
+                'samples': [[frame_id(label) for label in stack.split(';')] for stack, _ in stacks],
+                'weights': [count * self.sample_interval for _, count in stacks],
+            })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                '$schema': 'https://www.speedscope.app/file-format-schema.json',
+                'shared': {'frames': frames},
+                'profiles': profiles,
+                'name': self.name,
+                'exporter': 'Monitoring.profiling',
+            }, f)
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage; free when profiling is off"""
+    session = _active
+    if session is None or 'spans' not in session.modes:
+        yield
+        return
+    started = time.perf_counter()
+    session.record_span('O', name, started)
+    try:
+        yield
+    finally:
+        ended = time.perf_counter()
+        session.record_span('C', name, ended)
+        with session._span_lock:
+            session.span_totals[name] += ended - started
+
+
+def profiled_main(name: str):
+    """
+    Run an entry point under a ProfileSession when MONITOR_PROFILE is set.
+
+    Output goes to MONITOR_PROFILE_DIR (default `profiles/`).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            global _active
+            modes = enabled_modes()
+            if not modes or _active is not None:
+                return func(*args, **kwargs)
+            session = ProfileSession(name, modes, out_dir=os.getenv(PROFILE_DIR_ENV, 'profiles'))
+            _active = session.start()
+            try:
+                with span(f"{name}.main"):
+                    return func(*args, **kwargs)
+            finally:
+                _active = None
+                session.stop()
+        return wrapper
+    return decorator
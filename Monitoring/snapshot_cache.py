@@ -0,0 +1,116 @@
+import copy
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_snapshot(value: Any) -> bool:
+    """Monitor methods return an empty dict/DataFrame on error; those are never cached"""
+    if isinstance(value, pd.DataFrame):
+        return not value.empty
+    return bool(value)
+
+
+def snapshot_copy(value: Any) -> Any:
+    """Private copy of a cached snapshot, so one consumer's edits never reach another"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+class SnapshotCache:
+    """
+    Single-flight, stale-while-revalidate cache for exchange snapshots.
+
+    Each endpoint has a `(fresh, stale)` window in seconds. Within `fresh` the cached
+    value is served from the cache; between `fresh` and `stale` it is still returned while one
+    background refresh runs; past `stale` callers block on a fetch. Concurrent callers
+    asking for the same key share a single in-flight call. Every caller gets its own
+    copy of the snapshot (see `snapshot_copy`), so consumers may modify what they get.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, Tuple[float, float]]] = None,
+                 default_ttl: Tuple[float, float] = (1.0, 5.0), max_workers: int = 2):
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='snapshot-refresh')
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'errors': 0}
+
+    def get(self, endpoint: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        fresh, stale = self.ttls.get(endpoint, self.default_ttl)
+        cache_key = (endpoint, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            age = time.monotonic() - entry[1] if entry else None
+            if entry and age <= fresh:
+                self.stats['hits'] += 1
+                cached = entry
+            elif entry and age <= stale:
+                self.stats['stale_hits'] += 1
+                if cache_key not in self._inflight:
+                    self.stats['refreshes'] += 1
+                    future = Future()
+                    self._inflight[cache_key] = future
+                    self._executor.submit(self._load, cache_key, loader, future)
+                cached = entry
+            else:
+                cached = None
+                future = self._inflight.get(cache_key)
+                leader = future is None
+                if leader:
+                    self.stats['misses'] += 1
+                    future = Future()
+                    self._inflight[cache_key] = future
+                else:
+                    self.stats['coalesced'] += 1
+
+        # Copy outside the lock; the cached object itself is never handed out
+        if cached:
+            return snapshot_copy(cached[0])
+        if leader:
+            self._load(cache_key, loader, future)
+        return snapshot_copy(future.result())
+
+    def _load(self, cache_key: Hashable, loader: Callable[[], Any], future: Future):
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+                self._inflight.pop(cache_key, None)
+            logger.error(f"Snapshot refresh failed for {cache_key}: {str(e)}")
+            future.set_exception(e)
+            return
+        with self._lock:
+            if is_valid_snapshot(value):
+                self._entries[cache_key] = (value, time.monotonic())
+            else:
+                self.stats['errors'] += 1
+            self._inflight.pop(cache_key, None)
+        future.set_result(value)
+
+    def age(self, endpoint: str, key: Hashable) -> Optional[float]:
+        """Seconds since the cached snapshot was fetched, None if nothing is cached"""
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+        return time.monotonic() - entry[1] if entry else None
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                for cache_key in [k for k in self._entries if k[0] == endpoint]:
+                    del self._entries[cache_key]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,375 @@
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import websockets
+
+from Monitoring.profiling import profiled_main, span
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BINANCE_USER_STREAM_URL = 'wss://stream.binance.com:9443/ws'
+OPEN_STATUSES = {'NEW', 'PARTIALLY_FILLED'}
+
+
+class UserDataStream:
+    """
+    Live balances, open orders and fills from the Binance user data stream.
+
+    The stream is opened first and a REST snapshot (`get_account`, `get_open_orders`)
+    is loaded once connected, so nothing between the two is lost; after that
+    everything is kept current from executionReport / outboundAccountPosition /
+    balanceUpdate events, so balance, position and P/L queries are local lookups.
+    The listen key is kept alive in the background and re-created when it expires
+    or the socket drops; after every reconnect the snapshot is reloaded and fills
+    missed during the gap are backfilled from `get_my_trades`. Each fill is also
+    recorded in `trade_history` using the record shape of `save_trading_history`,
+    and passed to any `on_fill` callbacks.
+    """
+
+    def __init__(self, client, symbol: str = 'BTCUSDT', stream_url: str = BINANCE_USER_STREAM_URL,
+                 keepalive_interval: float = 30 * 60, reconnect_delay: float = 1.0,
+                 on_fill: Optional[Callable[[Dict], None]] = None):
+        self.client = client
+        self.symbol = symbol
+        self.base_asset = symbol[:-4]
+        self.stream_url = stream_url.rstrip('/')
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_delay = reconnect_delay
+        self.fill_callbacks: List[Callable[[Dict], None]] = [on_fill] if on_fill else []
+
+        self.balances: Dict[str, Dict[str, float]] = {}
+        self.open_orders: Dict[str, Dict] = {}   # client order id -> order state
+        self.fills: List[Dict] = []
+        self.trade_history: List[Dict] = []
+        self.listen_key: Optional[str] = None
+        self.connected = asyncio.Event()
+        self.last_event_time: Optional[datetime] = None
+
+        self._seen_trades = set()
+        self._last_trade_id = -1
+        self._started_at: Optional[int] = None
+        self._websocket = None
+        self._position_qty = 0.0
+        self._avg_cost = 0.0
+        self._realized_pnl = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+
+    # ------------------------------------------------------------- lifecycle
+    async def start(self, snapshot: bool = True):
+        """Connect, seed state from REST, then keep the stream and keepalive loops running"""
+        self._running = True
+        self._started_at = int(datetime.now().timestamp() * 1000)
+        self.listen_key = await self.client.stream_get_listen_key()
+        self._tasks = [asyncio.create_task(self._stream_loop(resync_first=snapshot)),
+                       asyncio.create_task(self._keepalive_loop())]
+        await asyncio.wait_for(self.connected.wait(), timeout=10)
+        logger.info("User data stream started")
+
+    async def stop(self):
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.listen_key:
+            try:
+                await self.client.stream_close(listenKey=self.listen_key)
+            except Exception as e:
+                logger.warning(f"Failed to close listen key: {str(e)}")
+            self.listen_key = None
+        self.connected.clear()
+        logger.info("User data stream stopped")
+
+    async def load_snapshot(self):
+        """Replace balances and open orders with the exchange's current view"""
+        try:
+            account = await self.client.get_account()
+            orders = await self.client.get_open_orders(symbol=self.symbol)
+            for balance in account.get('balances', []):
+                self.balances[balance['asset']] = {'free': float(balance['free']),
+                                                   'locked': float(balance['locked'])}
+            # Orders that filled or were cancelled while disconnected must not linger
+            self.open_orders.clear()
+            for order in orders:
+                self.open_orders[order['clientOrderId']] = {
+                    'client_order_id': order['clientOrderId'],
+                    'order_id': order['orderId'],
+                    'side': order['side'].lower(),
+                    'type': order['type'],
+                    'price': float(order['price']),
+                    'quantity': float(order['origQty']),
+                    'executed_qty': float(order['executedQty']),
+                    'status': order['status'],
+                }
+            logger.info(f"Loaded account snapshot: {len(self.balances)} balances, "
+                        f"{len(self.open_orders)} open orders")
+        except Exception as e:
+            logger.error(f"Failed to load account snapshot: {str(e)}")
+
+    async def backfill_fills(self):
+        """Record fills that happened while the stream was down, skipping ones already seen"""
+        limit = 1000
+        params = {'symbol': self.symbol, 'limit': limit}
+        if self._last_trade_id >= 0:
+            params['fromId'] = self._last_trade_id + 1
+        elif self._started_at is not None:
+            params['startTime'] = self._started_at
+        missed = 0
+        while True:
+            try:
+                trades = sorted(await self.client.get_my_trades(**params), key=lambda t: t['id'])
+            except Exception as e:
+                logger.error(f"Failed to backfill fills: {str(e)}")
+                break
+            for trade in trades:
+                if trade['id'] in self._seen_trades:
+                    continue
+                missed += 1
+                self._record_trade(trade)
+            if len(trades) < limit:
+                break
+            # Page forward by trade id until a short page comes back
+            params = {'symbol': self.symbol, 'limit': limit, 'fromId': trades[-1]['id'] + 1}
+        if missed:
+            logger.info(f"Backfilled {missed} fills missed while disconnected")
+
+    def _record_trade(self, trade: Dict):
+        """Record one get_my_trades row as a fill"""
+        self._record_fill({
+            'timestamp': datetime.fromtimestamp(trade['time'] / 1000),
+            'trade_id': trade['id'],
+            'order_id': trade['orderId'],
+            'client_order_id': None,
+            'action': 'buy' if trade['isBuyer'] else 'sell',
+            'price': float(trade['price']),
+            'quantity': float(trade['qty']),
+            'commission': float(trade.get('commission') or 0),
+            'commission_asset': trade.get('commissionAsset'),
+        })
+
+    async def resync(self):
+        with span('user_stream.resync'):
+            await self.load_snapshot()
+            await self.backfill_fills()
+
+    async def _renew_listen_key(self):
+        self.listen_key = await self.client.stream_get_listen_key()
+        logger.info("Obtained new listen key")
+
+    async def _keepalive_loop(self):
+        while self._running:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await self.client.stream_keepalive(listenKey=self.listen_key)
+                logger.info("Listen key keepalive sent")
+            except Exception as e:
+                logger.warning(f"Listen key keepalive failed, renewing: {str(e)}")
+                try:
+                    await self._renew_listen_key()
+                except Exception as renew_error:
+                    logger.error(f"Failed to renew listen key: {str(renew_error)}")
+                    continue
+                # The open socket is still on the dead key; closing it makes the stream loop reconnect
+                if self._websocket is not None:
+                    await self._websocket.close()
+
+    async def _stream_loop(self, resync_first: bool = True):
+        reconnecting = False
+        while self._running:
+            listen_key = self.listen_key
+            try:
+                async with websockets.connect(f"{self.stream_url}/{listen_key}") as websocket:
+                    self._websocket = websocket
+                    if reconnecting or resync_first:
+                        # Events sent before connecting are gone; (re)load state from REST
+                        await self.resync()
+                    self.connected.set()
+                    async for message in websocket:
+                        with span('user_stream.handle_event'):
+                            result = self.handle_event(json.loads(message))
+                        if result == 'expired':
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"User data stream disconnected: {str(e)}")
+            self._websocket = None
+            self.connected.clear()
+            if not self._running:
+                break
+            reconnecting = True
+            await asyncio.sleep(self.reconnect_delay)
+            if self.listen_key != listen_key:
+                # The keepalive loop already renewed the key
+                continue
+            try:
+                await self._renew_listen_key()
+            except Exception as e:
+                logger.error(f"Failed to renew listen key: {str(e)}")
+
+    # ---------------------------------------------------------------- events
+    def handle_event(self, event: Dict) -> Optional[str]:
+        event_type = event.get('e')
+        self.last_event_time = datetime.now()
+        if event_type == 'executionReport':
+            self._on_execution_report(event)
+        elif event_type == 'outboundAccountPosition':
+            for balance in event.get('B', []):
+                self.balances[balance['a']] = {'free': float(balance['f']), 'locked': float(balance['l'])}
+        elif event_type == 'balanceUpdate':
+            current = self.balances.setdefault(event['a'], {'free': 0.0, 'locked': 0.0})
+            current['free'] += float(event['d'])
+        elif event_type == 'listenKeyExpired':
+            logger.warning("Listen key expired, reconnecting")
+            return 'expired'
+        return event_type
+
+    def _on_execution_report(self, event: Dict):
+        if event.get('s') != self.symbol:
+            return
+        client_order_id = event['c']
+        if event['X'] in OPEN_STATUSES:
+            self.open_orders[client_order_id] = {
+                'client_order_id': client_order_id,
+                'order_id': event['i'],
+                'side': event['S'].lower(),
+                'type': event['o'],
+                'price': float(event['p']),
+                'quantity': float(event['q']),
+                'executed_qty': float(event['z']),
+                'status': event['X'],
+            }
+        else:
+            self.open_orders.pop(client_order_id, None)
+
+        if event.get('x') != 'TRADE':
+            return
+        self._record_fill({
+            'timestamp': datetime.fromtimestamp(event['T'] / 1000),
+            'trade_id': event.get('t', -1),
+            'order_id': event['i'],
+            'client_order_id': client_order_id,
+            'action': event['S'].lower(),
+            'price': float(event['L']),
+            'quantity': float(event['l']),
+            'commission': float(event.get('n') or 0),
+            'commission_asset': event.get('N'),
+        })
+
+    def _record_fill(self, fill: Dict):
+        if fill['trade_id'] in self._seen_trades:
+            return
+        self._seen_trades.add(fill['trade_id'])
+        self._last_trade_id = max(self._last_trade_id, fill['trade_id'])
+        self._apply_fill(fill)
+        self.fills.append(fill)
+        # Same record shape save_trading_history persists, one row per fill
+        record = {'action': fill['action'], 'price': fill['price'], 'quantity': fill['quantity'],
+                  'order_id': fill['order_id'], 'timestamp': fill['timestamp']}
+        self.trade_history.append(record)
+        for callback in self.fill_callbacks:
+            try:
+                callback(record)
+            except Exception as e:
+                logger.error(f"Fill callback error: {str(e)}")
+
+    def _apply_fill(self, fill: Dict):
+        """Average-cost position accounting in the quote asset"""
+        signed_qty = fill['quantity'] if fill['action'] == 'buy' else -fill['quantity']
+        if self._position_qty == 0 or (self._position_qty > 0) == (signed_qty > 0):
+            total = self._position_qty + signed_qty
+            self._avg_cost = (self._avg_cost * abs(self._position_qty) + fill['price'] * abs(signed_qty)) / abs(total)
+            self._position_qty = total
+        else:
+            closed = min(abs(signed_qty), abs(self._position_qty))
+            direction = 1 if self._position_qty > 0 else -1
+            self._realized_pnl += direction * (fill['price'] - self._avg_cost) * closed
+            self._position_qty += signed_qty
+            if abs(signed_qty) > closed:
+                self._avg_cost = fill['price']
+            elif self._position_qty == 0:
+                self._avg_cost = 0.0
+        if fill.get('commission_asset') == self.symbol[-4:]:
+            self._realized_pnl -= fill['commission']
+
+    # --------------------------------------------------------------- lookups
+    def balance(self, asset: str) -> float:
+        current = self.balances.get(asset, {})
+        return current.get('free', 0.0) + current.get('locked', 0.0)
+
+    def position(self) -> Dict:
+        return {
+            'symbol': self.symbol,
+            'balance': self.balance(self.base_asset),
+            'traded_qty': self._position_qty,
+            'avg_cost': self._avg_cost,
+        }
+
+    def pnl(self, mark_price: Optional[float] = None) -> Dict:
+        unrealized = (mark_price - self._avg_cost) * self._position_qty if mark_price and self._position_qty else 0.0
+        return {
+            'realized': self._realized_pnl,
+            'unrealized': unrealized,
+            'total': self._realized_pnl + unrealized,
+        }
+
+    def fills_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.fills)
+
+
+async def run_demo():
+    """Trade against the local exchange and watch the stream keep state in sync"""
+    from Monitoring.local_exchange import LocalExchange, LocalUserStreamServer
+    from Monitoring.order_manager import OrderManager
+
+    exchange = LocalExchange(seed=7)
+    server = await LocalUserStreamServer(exchange).start()
+    stream = UserDataStream(exchange, stream_url=server.url)
+    await stream.start()
+    try:
+        manager = OrderManager(exchange)
+        await manager.market('buy', 0.05)
+        await manager.market('sell', 0.02)
+        await asyncio.sleep(0.1)
+        ticker = await exchange.get_symbol_ticker(symbol=stream.symbol)
+        return stream, float(ticker['price'])
+    finally:
+        await stream.stop()
+        await server.stop()
+
+
+@profiled_main('user_stream')
+def main():
+    try:
+        logger.info("Starting user data stream demo against the local exchange")
+        stream, mark_price = asyncio.run(run_demo())
+
+        print("\nBalances:")
+        print("=========")
+        for asset, balance in stream.balances.items():
+            print(f"{asset}: {balance['free']:,.8f} free, {balance['locked']:,.8f} locked")
+
+        position = stream.position()
+        pnl = stream.pnl(mark_price)
+        print("\nPosition:")
+        print("=========")
+        print(f"Quantity: {position['traded_qty']:,.8f} BTC @ ${position['avg_cost']:,.2f}")
+        print(f"Realized P/L: ${pnl['realized']:,.2f}")
+        print(f"Unrealized P/L: ${pnl['unrealized']:,.2f}")
+        print(f"\nFills recorded: {len(stream.trade_history)}")
+    except Exception as e:
+        logger.error(f"Main function error: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import logging
 import time
 from dotenv import load_dotenv
 
+from Monitoring.profiling import profiled_main, span
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,37 +42,39 @@ class XNewsMonitor:
             query = ' '.join(query_parts)
             
             logger.info(f"Searching tweets with query: {query}")
-            tweets = self.client.search_recent_tweets(
-                query=query,
-                tweet_fields=['created_at', 'author_id', 'public_metrics', 'entities'],
-                user_fields=['name', 'username', 'verified'],
-                expansions=['author_id'],
-                max_results=max_results
-            )
+            with span('x.search_recent_tweets.request'):
+                tweets = self.client.search_recent_tweets(
+                    query=query,
+                    tweet_fields=['created_at', 'author_id', 'public_metrics', 'entities'],
+                    user_fields=['name', 'username', 'verified'],
+                    expansions=['author_id'],
+                    max_results=max_results
+                )
             
             if not tweets.data:
                 logger.info("No tweets found matching the criteria")
                 return pd.DataFrame()
             
-            users = {user.id: user for user in tweets.includes['users']} if 'users' in tweets.includes else {}
-            data = []
-            for tweet in tweets.data:
-                user = users.get(tweet.author_id, None)
-                if user:
-                    urls = [url['expanded_url'] for url in tweet.entities['urls']] if hasattr(tweet, 'entities') and 'urls' in tweet.entities else []
-                    tweet_data = {
-                        'created_at': tweet.created_at,
-                        'author_name': user.name,
-                        'author_username': user.username,
-                        'text': tweet.text,
-                        'urls': urls,
-                        'likes': tweet.public_metrics.get('like_count', 0),
-                        'retweets': tweet.public_metrics.get('retweet_count', 0),
-                        'replies': tweet.public_metrics.get('reply_count', 0)
-                    }
-                    data.append(tweet_data)
-            
-            df = pd.DataFrame(data)
+            with span('x.search_crypto_news.dataframe'):
+                users = {user.id: user for user in tweets.includes['users']} if 'users' in tweets.includes else {}
+                data = []
+                for tweet in tweets.data:
+                    user = users.get(tweet.author_id, None)
+                    if user:
+                        urls = [url['expanded_url'] for url in tweet.entities['urls']] if hasattr(tweet, 'entities') and 'urls' in tweet.entities else []
+                        tweet_data = {
+                            'created_at': tweet.created_at,
+                            'author_name': user.name,
+                            'author_username': user.username,
+                            'text': tweet.text,
+                            'urls': urls,
+                            'likes': tweet.public_metrics.get('like_count', 0),
+                            'retweets': tweet.public_metrics.get('retweet_count', 0),
+                            'replies': tweet.public_metrics.get('reply_count', 0)
+                        }
+                        data.append(tweet_data)
+                
+                df = pd.DataFrame(data)
             logger.info(f"Successfully fetched {len(df)} tweets")
             return df
         
@@ -92,6 +96,7 @@ def search_with_retry(monitor, retries=3, wait_time=60):
     return pd.DataFrame()
 
 
+@profiled_main('x_news')
 def main():
     try:
         logger.info("Starting X News Monitor")